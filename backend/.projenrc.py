@@ -20,7 +20,10 @@ project = AwsCdkPythonApp(
     'projen@0.88.3',
     'pytest@7.4.3'
   ],
-    context={"@aws-cdk/customresources:installLatestAwsSdkDefault": False},
+    context={
+        "@aws-cdk/customresources:installLatestAwsSdkDefault": False,
+        "@aws-cdk/aws-iam:minimizePolicies": True,
+    },
 )
 
 black_task = project.add_task("black")
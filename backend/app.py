@@ -1,23 +1,29 @@
 import os
 
-import cdk_nag
 from aws_cdk import App, Aspects, Environment
 
 import shared.shared_variables as shared_variables
 from resources.main import MyStack
 
-# for development, use account/region from cdk cli
+# for development, use account/region from cdk cli. The stack is always bound
+# to an environment so that account based names (S3 buckets) are literals
 dev_env = Environment(
-    account=os.getenv("CDK_DEFAULT_ACCOUNT"), region=os.getenv("CDK_DEFAULT_REGION")
+    account=os.environ["CDK_DEFAULT_ACCOUNT"], region=os.environ["CDK_DEFAULT_REGION"]
 )
 
-app = App()
+# Construct creation stack traces are only recorded in the metadata when
+# debugging the synthesis (CDK_STACK_TRACES=true)
+app = App(stack_traces=os.getenv("CDK_STACK_TRACES", "false").lower() == "true")
 
 # Change the stack name variable directly in the shared_variables.py file
 MyStack(app, shared_variables.STACK_NAME, env=dev_env)
 # MyStack(app, shared_variables.STACK_NAME, env=prod_env)
 
-# Aspects.of(app).add(cdk_nag.AwsSolutionsChecks(verbose=False))
+# The cdk_nag assembly is only loaded when the checks run
+if shared_variables.ENABLE_CDK_NAG:
+    import cdk_nag
+
+    Aspects.of(app).add(cdk_nag.AwsSolutionsChecks(verbose=False))
 
 
 app.synth()
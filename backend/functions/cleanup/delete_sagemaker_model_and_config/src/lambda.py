@@ -1,33 +1,158 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# The list and delete calls are throttled on busy accounts, the adaptive mode
+# retries them with exponential backoff and rate limits the client
+sagemaker = boto3.client(
+    "sagemaker", config=Config(retries={"mode": "adaptive", "max_attempts": 10})
+)
+application_autoscaling = boto3.client("application-autoscaling")
+cloudwatch = boto3.client("cloudwatch")
+
+# Largest page size of the list APIs
+PAGE_SIZE = 100
+
+# Endpoints cannot be deleted while they are in one of these statuses
+TRANSITIONAL_STATUSES = ("Creating", "Updating", "SystemUpdating", "RollingBack")
+# Time kept to delete the endpoint and report the result before the function times out
+DEADLINE_MARGIN_SECONDS = 30
+
+
+def deregister_scalable_target(endpoint_name):
+    # Deleting the endpoint leaves its scalable target and scaling policies,
+    # registered by the setup autoscaling function
+    resource_id = f"endpoint/{endpoint_name}/variant/AllTraffic"
+    policies = application_autoscaling.describe_scaling_policies(
+        ServiceNamespace="sagemaker", ResourceId=resource_id
+    )["ScalingPolicies"]
+    for policy in policies:
+        application_autoscaling.delete_scaling_policy(
+            PolicyName=policy["PolicyName"],
+            ServiceNamespace="sagemaker",
+            ResourceId=resource_id,
+            ScalableDimension=policy["ScalableDimension"],
+        )
+        print(f"Deleted scaling policy: {policy['PolicyName']}")
+    try:
+        application_autoscaling.deregister_scalable_target(
+            ServiceNamespace="sagemaker",
+            ResourceId=resource_id,
+            ScalableDimension="sagemaker:variant:DesiredInstanceCount",
+        )
+        print(f"Deregistered scalable target: {resource_id}")
+    except application_autoscaling.exceptions.ObjectNotFoundException:
+        # Autoscaling is only set up once the endpoint is in service
+        print(f"Scalable target {resource_id} not found")
+
+
+def delete_alarm(alarm_name):
+    try:
+        cloudwatch.delete_alarms(AlarmNames=[alarm_name])
+        print(f"Deleted alarm: {alarm_name}")
+    except cloudwatch.exceptions.ResourceNotFound:
+        # The alarm is only created once the endpoint is in service
+        print(f"Alarm {alarm_name} not found")
+
+
+def delete_endpoint(endpoint_name, deadline):
+    deregister_scalable_target(endpoint_name)
+
+    # Wait for a pending creation or update to end, with exponential backoff,
+    # otherwise the deletion fails and the endpoint keeps running
+    delay = 5
+    while True:
+        try:
+            status = sagemaker.describe_endpoint(EndpointName=endpoint_name)[
+                "EndpointStatus"
+            ]
+        except ClientError as e:
+            error = e.response["Error"]
+            if error["Code"] != "ValidationException" or (
+                "Could not find endpoint" not in error["Message"]
+            ):
+                raise
+            # The endpoint is only created once a model is uploaded
+            print(f"Endpoint {endpoint_name} not found")
+            return
+        if status == "Deleting":
+            print(f"Endpoint {endpoint_name} is already being deleted")
+            return
+        if status not in TRANSITIONAL_STATUSES:
+            break
+        if time.monotonic() + delay > deadline:
+            # Failing the deletion leaves the endpoint to be deleted on a retry
+            raise TimeoutError(
+                f"Endpoint {endpoint_name} is still {status}, it cannot be deleted"
+            )
+        print(f"Waiting {delay}s for endpoint {endpoint_name} ({status})")
+        time.sleep(delay)
+        delay = min(delay * 2, 60)
+
+    # Errors are raised, the stack deletion fails instead of leaving the endpoint
+    sagemaker.delete_endpoint(EndpointName=endpoint_name)
+    print(f"Deleted endpoint: {endpoint_name}")
+
+
+def delete_endpoint_configs(prefix):
+    paginator = sagemaker.get_paginator("list_endpoint_configs")
+    for page in paginator.paginate(
+        NameContains=prefix, PaginationConfig={"PageSize": PAGE_SIZE}
+    ):
+        for config in page["EndpointConfigs"]:
+            try:
+                sagemaker.delete_endpoint_config(
+                    EndpointConfigName=config["EndpointConfigName"]
+                )
+                print(f"Deleted endpoint config: {config['EndpointConfigName']}")
+            except Exception as e:
+                print(
+                    f"Error deleting endpoint config {config['EndpointConfigName']}: {str(e)}"
+                )
+
+
+def delete_models(prefix):
+    paginator = sagemaker.get_paginator("list_models")
+    for page in paginator.paginate(
+        NameContains=prefix, PaginationConfig={"PageSize": PAGE_SIZE}
+    ):
+        for model in page["Models"]:
+            try:
+                sagemaker.delete_model(ModelName=model["ModelName"])
+                print(f"Deleted model: {model['ModelName']}")
+            except Exception as e:
+                print(f"Error deleting model {model['ModelName']}: {str(e)}")
 
 
 def handler(event, context):
-    sagemaker = boto3.client("sagemaker", region_name=event["region"])
-    action = event["action"]
-    prefix = event["prefix"]
-
-    if action == "DELETE_ENDPOINT_CONFIGS":
-        paginator = sagemaker.get_paginator("list_endpoint_configs")
-        for page in paginator.paginate(NameContains=prefix):
-            for config in page["EndpointConfigs"]:
-                try:
-                    sagemaker.delete_endpoint_config(
-                        EndpointConfigName=config["EndpointConfigName"]
-                    )
-                    print(f"Deleted endpoint config: {config['EndpointConfigName']}")
-                except Exception as e:
-                    print(
-                        f"Error deleting endpoint config {config['EndpointConfigName']}: {str(e)}"
-                    )
-
-    elif action == "DELETE_MODELS":
-        paginator = sagemaker.get_paginator("list_models")
-        for page in paginator.paginate(NameContains=prefix):
-            for model in page["Models"]:
-                try:
-                    sagemaker.delete_model(ModelName=model["ModelName"])
-                    print(f"Deleted model: {model['ModelName']}")
-                except Exception as e:
-                    print(f"Error deleting model {model['ModelName']}: {str(e)}")
-
-    return {"statusCode": 200}
+    # Custom resource event, the SageMaker resources are only deleted with the stack
+    properties = event["ResourceProperties"]
+    endpoint_name = properties["EndpointName"]
+    if event["RequestType"] != "Delete":
+        return {"PhysicalResourceId": endpoint_name}
+
+    deadline = (
+        time.monotonic()
+        + context.get_remaining_time_in_millis() / 1000
+        - DEADLINE_MARGIN_SECONDS
+    )
+
+    # SageMaker accepts deleting configs and models still used by the endpoint,
+    # the three deletions run in parallel
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        futures = [
+            executor.submit(delete_endpoint, endpoint_name, deadline),
+            executor.submit(delete_endpoint_configs, properties["ConfigPrefix"]),
+            executor.submit(delete_models, properties["ModelPrefix"]),
+        ]
+        for future in futures:
+            future.result()
+
+    # Only set for async inference endpoints, scaled on the request backlog
+    if "AlarmName" in properties:
+        delete_alarm(properties["AlarmName"])
+
+    return {"PhysicalResourceId": endpoint_name}
@@ -4,7 +4,11 @@ import boto3
 
 
 def handler(event, context):
-    efs_id = event["EfsId"]
+    # Custom resource event, the EFS is only deleted with the stack
+    efs_id = event["ResourceProperties"]["EfsId"]
+    if event["RequestType"] != "Delete":
+        return {"PhysicalResourceId": efs_id}
+
     efs_client = boto3.client("efs")
 
     try:
@@ -36,12 +40,9 @@ def handler(event, context):
         efs_client.delete_file_system(FileSystemId=efs_id)
 
         print(f"Successfully deleted EFS {efs_id}")
-        return {
-            "statusCode": 200,
-            "body": f"EFS {efs_id} and all its mount targets deleted successfully",
-        }
 
     except Exception as e:
+        # Do not block the stack deletion, as the AWS SDK call did before
         print(f"Error deleting EFS {efs_id}: {str(e)}")
 
-        return {"statusCode": 500, "body": f"{e}"}
+    return {"PhysicalResourceId": efs_id}
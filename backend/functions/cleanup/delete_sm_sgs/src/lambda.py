@@ -4,7 +4,11 @@ import boto3
 
 
 def handler(event, context):
-    vpc_id = event["vpc_id"]
+    # Custom resource event, the security groups are only deleted with the stack
+    vpc_id = event["ResourceProperties"]["vpc_id"]
+    if event["RequestType"] != "Delete":
+        return {"PhysicalResourceId": vpc_id}
+
     ec2 = boto3.client("ec2")
 
     def get_non_default_security_groups():
@@ -52,4 +56,4 @@ def handler(event, context):
         # Wait for a short period before the next iteration
         time.sleep(20)
 
-    return {"statusCode": 200, "body": "Security group deletion process completed"}
+    return {"PhysicalResourceId": vpc_id}
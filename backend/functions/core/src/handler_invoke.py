@@ -0,0 +1,162 @@
+import base64
+import json
+import os
+import time
+import uuid
+
+import boto3
+
+global client
+client = boto3.client("sagemaker-runtime")
+
+global endpoint_name
+endpoint_name = os.environ["ENDPOINT_NAME"]
+
+global content_type
+content_type = "application/json"
+
+# Only set when the endpoint serves async inference
+global async_input_path
+async_input_path = os.environ.get("ASYNC_INPUT_PATH")
+if async_input_path:
+    s3_client = boto3.client("s3")
+
+
+def split_s3_uri(uri):
+    bucket, key = uri[len("s3://") :].split("/", 1)
+    return bucket, key
+
+
+# Time kept to return the gateway timeout response before the function is stopped
+DEADLINE_MARGIN_SECONDS = 1
+
+
+def invoke_endpoint_async(payload, deadline):
+    bucket, prefix = split_s3_uri(async_input_path)
+    key = f"{prefix}{uuid.uuid4()}.json"
+    s3_client.put_object(Bucket=bucket, Key=key, Body=payload, ContentType=content_type)
+
+    response = client.invoke_endpoint_async(
+        EndpointName=endpoint_name,
+        ContentType=content_type,
+        InputLocation=f"s3://{bucket}/{key}",
+    )
+
+    # Wait for the response (or the failure) to be written, until the deadline
+    output_bucket, output_key = split_s3_uri(response["OutputLocation"])
+    failure_bucket, failure_key = split_s3_uri(response["FailureLocation"])
+    while time.monotonic() < deadline:
+        try:
+            return s3_client.get_object(Bucket=output_bucket, Key=output_key)["Body"]
+        except s3_client.exceptions.NoSuchKey:
+            pass
+        try:
+            failure = s3_client.get_object(Bucket=failure_bucket, Key=failure_key)
+            raise RuntimeError(failure["Body"].read().decode("utf-8"))
+        except s3_client.exceptions.NoSuchKey:
+            time.sleep(0.5)
+    raise TimeoutError(f"No response written to {response['OutputLocation']} in time")
+
+
+def make_prompt_return_string(prompt_img, img_data, deadline):
+    payload = {
+        "prompt": prompt_img,
+        "image": img_data,
+    }
+    payload = json.dumps(payload)
+
+    if async_input_path:
+        body = invoke_endpoint_async(payload, deadline)
+    else:
+        body = client.invoke_endpoint(
+            EndpointName=endpoint_name, ContentType=content_type, Body=payload
+        )["Body"]
+
+    return body.read().decode("utf-8").split("\\n")[1].split('"}')[0]
+
+
+def get_base64_from_image(input_img_path):
+    with open(input_img_path, "rb") as f:
+        input_img_image_bytes = f.read()
+
+    return base64.b64encode(bytearray(input_img_image_bytes)).decode()
+
+
+def handler(event, context):
+    ####### Validate request #######
+
+    if not event or not event.get("body"):
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": "Invalid request body"}),
+        }
+
+    try:
+        event = json.loads(event.get("body", {}))
+    except json.JSONDecodeError:
+        return {"statusCode": 400, "body": json.dumps({"error": "Invalid JSON"})}
+
+    # Validate required fields
+    required_fields = ["image_data", "prompt_1", "prompt_2", "prompt_3", "prompt_4"]
+    for field in required_fields:
+        if field not in event:
+            return {
+                "statusCode": 400,
+                "body": json.dumps({"error": f"Missing required field: {field}"}),
+            }
+
+    image_data = event["image_data"].split("base64,")[1].replace('"}', "")
+    prompt_1 = event["prompt_1"]
+    prompt_2 = event["prompt_2"]
+    prompt_3 = event["prompt_3"]
+    prompt_4 = event["prompt_4"]
+
+    start_time = time.time()
+    # The async responses are awaited until the function (and the API) times out
+    deadline = (
+        time.monotonic()
+        + context.get_remaining_time_in_millis() / 1000
+        - DEADLINE_MARGIN_SECONDS
+    )
+
+    try:
+        response_to_prompt = make_prompt_return_string(prompt_1, image_data, deadline)
+        response_to_prompt_2 = ""
+        response_to_prompt_3 = ""
+
+        if response_to_prompt == "yes":
+            response_to_prompt_2 = make_prompt_return_string(
+                prompt_2, image_data, deadline
+            )
+
+        if response_to_prompt_2 == "yes":
+            response_to_prompt_3 = make_prompt_return_string(
+                prompt_3, image_data, deadline
+            )
+        elif response_to_prompt_2 == "no":
+            response_to_prompt_3 = make_prompt_return_string(
+                prompt_4, image_data, deadline
+            )
+    except TimeoutError as e:
+        print(str(e))
+        return {
+            "statusCode": 504,
+            "body": json.dumps({"error": "The inference did not complete in time"}),
+        }
+
+    end_time = time.time()
+    elapsed_time = end_time - start_time
+    print(
+        f"{elapsed_time:<15.3f} {response_to_prompt:<20} {response_to_prompt_2:<20} {response_to_prompt_3:<20}"
+    )
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps(
+            {
+                "first_prompt_answer": response_to_prompt,
+                "second_prompt_answer": response_to_prompt_2,
+                "third_prompt_answer": response_to_prompt_3,
+            }
+        ),
+    }
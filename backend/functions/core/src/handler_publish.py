@@ -0,0 +1,29 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import boto3
+
+s3_client = boto3.client("s3")
+
+
+def split_s3_uri(uri):
+    bucket, key = uri[len("s3://") :].split("/", 1)
+    return bucket, key
+
+
+def handler(event, context):
+    # Invoked by the PublishModel step of the download and pack pipelines: the
+    # model packed by the (possibly cached) step is copied to the execution's
+    # own key, the registered model versions never share an artifact
+    source_bucket, source_key = split_s3_uri(event["SourceUri"])
+    destination_bucket, destination_key = split_s3_uri(event["DestinationUri"])
+
+    # Server-side managed copy, multipart for the archives larger than 5 GB
+    s3_client.copy(
+        {"Bucket": source_bucket, "Key": source_key},
+        destination_bucket,
+        destination_key,
+    )
+    print(f"Copied {event['SourceUri']} to {event['DestinationUri']}")
+
+    return {"ModelDataUrl": event["DestinationUri"]}
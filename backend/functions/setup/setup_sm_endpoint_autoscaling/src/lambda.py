@@ -6,6 +6,12 @@ from botocore.exceptions import ClientError
 # sagemaker_client = boto3.client("sagemaker")
 application_autoscaling_client = boto3.client("application-autoscaling")
 
+# Async inference endpoints scale on their queue and down to zero instances
+async_inference = os.environ.get("ASYNC_INFERENCE", "false") == "true"
+# Only needed for the backlog alarm, each client loads its service model
+if async_inference:
+    cloudwatch_client = boto3.client("cloudwatch")
+
 
 def handler(event, context):
     print(f"{event=}")
@@ -46,10 +52,14 @@ def setup_auto_scaling(endpoint_name):
         ServiceNamespace="sagemaker",
         ResourceId=resource_id,
         ScalableDimension="sagemaker:variant:DesiredInstanceCount",
-        MinCapacity=1,
+        MinCapacity=0 if async_inference else 1,
         MaxCapacity=2,
     )
 
+    if async_inference:
+        setup_backlog_scaling(endpoint_name, resource_id)
+        return
+
     application_autoscaling_client.put_scaling_policy(
         PolicyName="SageMakerScalingPolicy",
         ServiceNamespace="sagemaker",
@@ -65,3 +75,58 @@ def setup_auto_scaling(endpoint_name):
             "ScaleOutCooldown": 300,
         },
     )
+
+
+def setup_backlog_scaling(endpoint_name, resource_id):
+    # https://docs.aws.amazon.com/sagemaker/latest/dg/async-inference-autoscale.html
+    application_autoscaling_client.put_scaling_policy(
+        PolicyName="SageMakerBacklogScalingPolicy",
+        ServiceNamespace="sagemaker",
+        ResourceId=resource_id,
+        ScalableDimension="sagemaker:variant:DesiredInstanceCount",
+        PolicyType="TargetTrackingScaling",
+        TargetTrackingScalingPolicyConfiguration={
+            "TargetValue": 5.0,
+            "CustomizedMetricSpecification": {
+                "MetricName": "ApproximateBacklogSizePerInstance",
+                "Namespace": "AWS/SageMaker",
+                "Dimensions": [{"Name": "EndpointName", "Value": endpoint_name}],
+                "Statistic": "Average",
+            },
+            "ScaleInCooldown": 600,
+            "ScaleOutCooldown": 300,
+        },
+    )
+
+    # The backlog per instance is not defined at zero instances, the first
+    # instance is started by an alarm on the queued requests instead
+    response = application_autoscaling_client.put_scaling_policy(
+        PolicyName="SageMakerHasBacklogWithoutCapacityPolicy",
+        ServiceNamespace="sagemaker",
+        ResourceId=resource_id,
+        ScalableDimension="sagemaker:variant:DesiredInstanceCount",
+        PolicyType="StepScaling",
+        StepScalingPolicyConfiguration={
+            "AdjustmentType": "ChangeInCapacity",
+            "MetricAggregationType": "Average",
+            "Cooldown": 300,
+            "StepAdjustments": [
+                {"MetricIntervalLowerBound": 0, "ScalingAdjustment": 1}
+            ],
+        },
+    )
+
+    cloudwatch_client.put_metric_alarm(
+        AlarmName=os.environ["BACKLOG_ALARM_NAME"],
+        MetricName="HasBacklogWithoutCapacity",
+        Namespace="AWS/SageMaker",
+        Dimensions=[{"Name": "EndpointName", "Value": endpoint_name}],
+        Statistic="Average",
+        Period=60,
+        EvaluationPeriods=2,
+        DatapointsToAlarm=2,
+        Threshold=1,
+        ComparisonOperator="GreaterThanOrEqualToThreshold",
+        TreatMissingData="missing",
+        AlarmActions=[response["PolicyARN"]],
+    )
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 
@@ -6,7 +7,12 @@ from botocore.exceptions import ClientError
 
 sagemaker_client = boto3.client("sagemaker")
 s3_client = boto3.client("s3")
-application_autoscaling_client = boto3.client("application-autoscaling")
+
+MODEL_ARCHIVE_KEY = "paligemma/model.tar.gz"
+# Uncompressed model files, used when there is no archive
+MODEL_PREFIX = "paligemma/model/"
+# Uploaded after the uncompressed model files, only this upload triggers the update
+MODEL_UPLOAD_MARKER_KEY = "paligemma/model.done"
 
 
 def get_model_etag(bucket, key):
@@ -15,22 +21,83 @@ def get_model_etag(bucket, key):
         # Remove quotes from etag and remove any special characters
         return response["ETag"].strip('"').replace("-", "")
     except ClientError as e:
+        if e.response["Error"]["Code"] == "404":
+            return None
         print(f"Error getting model etag: {e}")
         raise
 
 
+def get_model_prefix_version(bucket, prefix):
+    # Hash of the object keys and ETags, changes when any model file changes
+    digest = hashlib.md5(usedforsecurity=False)
+    paginator = s3_client.get_paginator("list_objects_v2")
+    object_count = 0
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for model_object in page.get("Contents", []):
+            digest.update(f"{model_object['Key']}{model_object['ETag']}".encode())
+            object_count += 1
+    if not object_count:
+        raise ValueError(
+            f"No model found in s3://{bucket}/{MODEL_ARCHIVE_KEY} or s3://{bucket}/{prefix}"
+        )
+    return digest.hexdigest()
+
+
 def handler(event, context):
+    # Custom resource event when the model weights are baked in the image, the
+    # endpoint is deleted by the cleanup custom resource
+    if "RequestType" in event:
+        if event["RequestType"] == "Delete":
+            return {"PhysicalResourceId": event["PhysicalResourceId"]}
+        model_image_version = event["ResourceProperties"]["ModelImageVersion"]
+        update_endpoint(model_image_version)
+        return {"PhysicalResourceId": os.environ["ENDPOINT_NAME"]}
+
+    # S3 notifications are batched by the queue, the model file is read once
+    # and the endpoint is only updated when its ETag changed
+    print(f"Triggered by {len(event.get('Records', []))} notification(s)")
+    return update_endpoint()
+
+
+def update_endpoint(model_image_version=None):
     bucket = os.environ["BUCKET_NAME"]
     domain_arn = os.environ["DOMAIN_ARN"]
     endpoint_name = os.environ["ENDPOINT_NAME"]
     execution_role = os.environ["EXECUTION_ROLE_ARN"]
     image = os.environ["ECR_IMAGE"]
     instance_type = os.environ["INSTANCE_TYPE"]
+    # Only set when the endpoint serves async inference
+    async_output_path = os.environ.get("ASYNC_OUTPUT_PATH")
 
-    key = "paligemma/model.tar.gz"
-    model_etag = get_model_etag(bucket, key)
+    # Only set when the model weights are baked in the image
+    if model_image_version:
+        model_etag = model_image_version[:32]
+        model_data = {"Mode": "SingleModel"}
+    elif model_etag := get_model_etag(bucket, MODEL_ARCHIVE_KEY):
+        model_data = {"ModelDataUrl": f"s3://{bucket}/{MODEL_ARCHIVE_KEY}"}
+    else:
+        # A partial upload of the model files is never deployed
+        if get_model_etag(bucket, MODEL_UPLOAD_MARKER_KEY) is None:
+            raise ValueError(
+                f"Upload s3://{bucket}/{MODEL_UPLOAD_MARKER_KEY} once all the model files are uploaded"
+            )
+        # SageMaker downloads the files in parallel, without extraction step
+        model_etag = get_model_prefix_version(bucket, MODEL_PREFIX)
+        model_data = {
+            "ModelDataSource": {
+                "S3DataSource": {
+                    "S3Uri": f"s3://{bucket}/{MODEL_PREFIX}",
+                    "S3DataType": "S3Prefix",
+                    "CompressionType": "None",
+                }
+            }
+        }
     model_name = f"paligemma-model-{model_etag}"
-    endpoint_config_name = f"paligemma-endpoint-config-{model_etag}"
+    # The config kind is part of the name so that changing the endpoint settings
+    # creates a new config (a: async inference, l: least outstanding requests
+    # routing). Kept short, the names are limited to 63 characters
+    config_kind = "a" if async_output_path else "l"
+    endpoint_config_name = f"paligemma-endpoint-config-{config_kind}-{model_etag}"
 
     # Check if model exists
     model_exists = False
@@ -45,18 +112,20 @@ def handler(event, context):
 
     # Create model if it doesn't exist
     if not model_exists:
+        container = {
+            "Image": image,
+            "Environment": {
+                "SAGEMAKER_PROGRAM": "inference.py",
+                "SAGEMAKER_SUBMIT_DIRECTORY": "/opt/ml/model/code",
+                "HF_TASK": "image-text-to-text",
+            },
+            **model_data,
+        }
+
         sagemaker_client.create_model(
             ModelName=model_name,
             ExecutionRoleArn=execution_role,
-            PrimaryContainer={
-                "Image": image,
-                "ModelDataUrl": f"s3://{bucket}/{key}",
-                "Environment": {
-                    "SAGEMAKER_PROGRAM": "inference.py",
-                    "SAGEMAKER_SUBMIT_DIRECTORY": "/opt/ml/model/code",
-                    "HF_TASK": "image-text-to-text",
-                },
-            },
+            PrimaryContainer=container,
             Tags=[{"Key": "domain-arn", "Value": domain_arn}],
         )
         print(f"Created new model: {model_name}")
@@ -76,6 +145,26 @@ def handler(event, context):
 
     # Create endpoint config if it doesn't exist
     if not endpoint_config_exists:
+        # Real-time requests go to the instance with the fewest requests in
+        # flight, the latency varies with the prompt and image sizes
+        routing_config = {
+            "RoutingConfig": {"RoutingStrategy": "LEAST_OUTSTANDING_REQUESTS"}
+        }
+        async_config = {}
+        if async_output_path:
+            # Requests are queued, the routing strategy only applies to real-time
+            routing_config = {}
+            async_config["AsyncInferenceConfig"] = {
+                "OutputConfig": {
+                    "S3OutputPath": async_output_path,
+                    "S3FailurePath": os.environ["ASYNC_FAILURE_PATH"],
+                    "NotificationConfig": {
+                        "ErrorTopic": os.environ["ASYNC_ERROR_TOPIC_ARN"],
+                    },
+                },
+                "ClientConfig": {"MaxConcurrentInvocationsPerInstance": 4},
+            }
+
         sagemaker_client.create_endpoint_config(
             EndpointConfigName=endpoint_config_name,
             ProductionVariants=[
@@ -85,6 +174,7 @@ def handler(event, context):
                     "ModelName": model_name,
                     "VariantName": "AllTraffic",
                     "InitialVariantWeight": 1.0,
+                    **routing_config,
                 }
             ],
             DataCaptureConfig={
@@ -95,44 +185,53 @@ def handler(event, context):
                 "CaptureContentTypeHeader": {"JsonContentTypes": ["application/json"]},
             },
             Tags=[{"Key": "domain-arn", "Value": domain_arn}],
+            **async_config,
         )
         print(f"Created new endpoint config: {endpoint_config_name}")
 
     # Check if endpoint exists and create/update as needed
     try:
         endpoint_info = sagemaker_client.describe_endpoint(EndpointName=endpoint_name)
-        current_config = endpoint_info["EndpointConfigName"]
-
-        # Update endpoint if it exists but has a different config
-        if current_config != endpoint_config_name:
-            sagemaker_client.update_endpoint(
-                EndpointName=endpoint_name,
-                EndpointConfigName=endpoint_config_name,
-                DeploymentConfig={
-                    "RollingUpdatePolicy": {
-                        "MaximumBatchSize": {"Type": "CAPACITY_PERCENT", "Value": 50},
-                        "WaitIntervalInSeconds": 660,
-                        "MaximumExecutionTimeoutInSeconds": 1920,
-                        "RollbackMaximumBatchSize": {
-                            "Type": "CAPACITY_PERCENT",
-                            "Value": 50,
-                        },
-                    }
-                },
-            )
-            action = "Updated"
-        else:
-            action = "No update needed for"
     except ClientError as e:
-        if e.response["Error"]["Code"] == "ValidationException":
-            # Create endpoint if it doesn't exist
-            sagemaker_client.create_endpoint(
-                EndpointName=endpoint_name, EndpointConfigName=endpoint_config_name
-            )
-            action = "Created"
-        else:
+        error = e.response["Error"]
+        if error["Code"] != "ValidationException" or (
+            "Could not find endpoint" not in error["Message"]
+        ):
             print(f"Error checking endpoint existence: {e}")
             raise
+        endpoint_info = None
+
+    if endpoint_info is None:
+        sagemaker_client.create_endpoint(
+            EndpointName=endpoint_name, EndpointConfigName=endpoint_config_name
+        )
+        action = "Created"
+    elif endpoint_info["EndpointConfigName"] == endpoint_config_name:
+        action = "No update needed for"
+    elif endpoint_info["EndpointStatus"] != "InService":
+        # The endpoint cannot be updated during a creation or another update,
+        # raised so that the queue delivers the notification again later
+        raise RuntimeError(
+            f"Endpoint {endpoint_name} is {endpoint_info['EndpointStatus']}, "
+            f"{endpoint_config_name} is deployed on a later attempt"
+        )
+    else:
+        sagemaker_client.update_endpoint(
+            EndpointName=endpoint_name,
+            EndpointConfigName=endpoint_config_name,
+            DeploymentConfig={
+                "RollingUpdatePolicy": {
+                    "MaximumBatchSize": {"Type": "CAPACITY_PERCENT", "Value": 50},
+                    "WaitIntervalInSeconds": 660,
+                    "MaximumExecutionTimeoutInSeconds": 1920,
+                    "RollbackMaximumBatchSize": {
+                        "Type": "CAPACITY_PERCENT",
+                        "Value": 50,
+                    },
+                }
+            },
+        )
+        action = "Updated"
 
     return {
         "statusCode": 200,
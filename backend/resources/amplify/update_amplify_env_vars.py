@@ -0,0 +1,55 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+import sys
+
+import boto3
+import shared_variables as shared_variables
+
+
+def get_output_value(json_output_cdk_data, construct_id, requested_output_key):
+    # Outputs of the constructs have a logical ID made of the construct ID, the
+    # output key and a hash suffix
+    for item in json_output_cdk_data:
+        if item.get("OutputKey").startswith(f"{construct_id}{requested_output_key}"):
+            return item.get("OutputValue")
+
+    raise Exception(
+        f"Output key {requested_output_key} not found in CDK stack outputs. Exiting."
+    )
+
+
+if len(sys.argv) != 2:
+    print(f"Usage: {sys.argv[0]} <amplify-app-id>")
+    sys.exit(1)
+
+amplify_app_id = sys.argv[1]
+
+# Retrieve the parameters from the CDK deployment
+cfn = boto3.client("cloudformation", region_name=shared_variables.CDK_OUT_KEY_REGION)
+response = cfn.describe_stacks(StackName=shared_variables.STACK_NAME)
+outputs = response["Stacks"][0]["Outputs"]
+
+api_gateway_endpoint = get_output_value(
+    outputs, "ApiGwConstruct", shared_variables.CDK_OUT_KEY_API_GATEWAY_ENDPOINT
+)
+
+amplify_env_vars = {
+    "NEXT_PUBLIC_COGNITO_USER_POOL_CLIENT_ID": get_output_value(
+        outputs, "Cognito", shared_variables.CDK_OUT_KEY_COGNITO_USER_POOL_CLIENT_ID
+    ),
+    "NEXT_PUBLIC_COGNITO_USER_POOL_ID": get_output_value(
+        outputs, "Cognito", shared_variables.CDK_OUT_KEY_COGNITO_USER_POOL_ID
+    ),
+    # Same value as the API construct get_url() (trailing slash)
+    "NEXT_PUBLIC_API_GATEWAY_ENDPOINT": api_gateway_endpoint.rstrip("/") + "/",
+    "NEXT_PUBLIC_DEBUG_AUDIO": "true",
+    "NEXT_PUBLIC_DEBUG_DEPTH": "true",
+    "NEXT_PUBLIC_DEBUG_DETECTION": "true",
+    "NEXT_PUBLIC_DEBUG_IMAGE_CAPTIONING": "true",
+}
+
+# Update the existing Amplify App
+amplify = boto3.client("amplify", region_name=shared_variables.CDK_OUT_KEY_REGION)
+amplify.update_app(appId=amplify_app_id, environmentVariables=amplify_env_vars)
+
+print(f"Amplify app {amplify_app_id} environment variables updated")
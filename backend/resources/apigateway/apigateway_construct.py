@@ -1,19 +1,60 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import json
+from typing import TYPE_CHECKING, Dict, List, Optional
+
 import aws_cdk.aws_apigatewayv2 as apigatewayv2
 import shared_variables as shared_variables
-from aws_cdk import CfnOutput, Duration, RemovalPolicy
-from aws_cdk import aws_certificatemanager as acm
+from aws_cdk import Aws, Duration
 from aws_cdk import aws_cognito as cognito_
 from aws_cdk import aws_ec2 as ec2
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda as lambda_
 from aws_cdk import aws_logs as logs
-from aws_cdk.aws_apigatewayv2_authorizers import HttpUserPoolAuthorizer
-from aws_cdk.aws_apigatewayv2_integrations import HttpLambdaIntegration
 from constructs import Construct
-from typing import Optional
+
+from resources.log_groups import create_log_group
+from resources.nag_suppressions import add_nag_suppressions
+from resources.outputs import emit_outputs
+
+# Only needed for the annotations, the modules are imported where they are used
+if TYPE_CHECKING:
+    from aws_cdk import aws_certificatemanager as acm
+    from aws_cdk import aws_cloudfront as cloudfront
+    from aws_cdk.aws_apigatewayv2_integrations import HttpLambdaIntegration
+
+CORS_ALLOW_HEADERS = (
+    "Authorization",
+    "content-type",
+    "x-amz-date",
+    "x-api-key",
+)
+CORS_ALLOW_METHODS = (
+    apigatewayv2.CorsHttpMethod.GET,
+    apigatewayv2.CorsHttpMethod.HEAD,
+    apigatewayv2.CorsHttpMethod.OPTIONS,
+    apigatewayv2.CorsHttpMethod.POST,
+)
+CORS_MAX_AGE = Duration.days(10)
+
+# Route methods, resolved once per process
+HTTP_METHOD_GET = apigatewayv2.HttpMethod.GET
+HTTP_METHOD_POST = apigatewayv2.HttpMethod.POST
+
+ACCESS_LOG_FORMAT = json.dumps(
+    {
+        "requestId": "$context.requestId",
+        "ip": "$context.identity.sourceIp",
+        "requestTime": "$context.requestTime",
+        "httpMethod": "$context.httpMethod",
+        "routeKey": "$context.routeKey",
+        "status": "$context.status",
+        "protocol": "$context.protocol",
+        "responseLength": "$context.responseLength",
+    },
+    separators=(",", ":"),
+)
 
 
 class API(Construct):
@@ -23,16 +64,28 @@ class API(Construct):
         id_: str,
         *,
         lambda_models_url: lambda_.Function,
-        lambda_invoke_sagemaker: lambda_.Function,
+        lambda_invoke_sagemaker: Optional[lambda_.Function],
         vpc_invoke_sagemaker: ec2.Vpc,
+        vpc_link_subnets: List[ec2.ISubnet],
         cognito_user_pool: cognito_.CfnUserPool,
         cognito_user_pool_client: cognito_.CfnUserPoolClient,
         trusted_origins,
         custom_domain_name: Optional[str] = None,
-        certificate_arn: Optional[str] = None,
+        certificate: Optional["acm.ICertificate"] = None,
+        enable_edge_cache: bool = False,
+        edge_cache_policy: Optional["cloudfront.ICachePolicy"] = None,
+        prewarm_concurrency: int = 0,
+        access_log_class: logs.LogGroupClass = logs.LogGroupClass.STANDARD,
+        access_log_retention: logs.RetentionDays = logs.RetentionDays.ONE_WEEK,
+        existing_log_group_arn: Optional[str] = None,
     ):
         super().__init__(scope, id_)
 
+        from aws_cdk.aws_apigatewayv2_authorizers import HttpUserPoolAuthorizer
+
+        # Lambda integrations by function ARN, see _integration_for
+        self._integrations: Dict[str, "HttpLambdaIntegration"] = {}
+
         #########################################
         ########### Create the api gateway ######
         #########################################
@@ -47,125 +100,220 @@ class API(Construct):
             self,
             "vis-assis-http-api",
             cors_preflight=apigatewayv2.CorsPreflightOptions(
-                allow_headers=[
-                    "Authorization",
-                    "content-type",
-                    "x-amz-date",
-                    "x-api-key",
-                ],
-                allow_methods=[
-                    apigatewayv2.CorsHttpMethod.GET,
-                    apigatewayv2.CorsHttpMethod.HEAD,
-                    apigatewayv2.CorsHttpMethod.OPTIONS,
-                    apigatewayv2.CorsHttpMethod.POST,
-                ],
+                allow_headers=list(CORS_ALLOW_HEADERS),
+                allow_methods=list(CORS_ALLOW_METHODS),
                 allow_origins=trusted_origins,
-                max_age=Duration.days(10),
+                max_age=CORS_MAX_AGE,
             ),
         )
 
+        # (key, value, export name, description)
+        outputs = []
+
         #########################################
         ########### Custom Domain (Optional) ####
         #########################################
 
-        if custom_domain_name and certificate_arn:
-            # Import existing certificate
-            certificate = acm.Certificate.from_certificate_arn(
-                self, "ApiCertificate", certificate_arn
-            )
-            
-            # Create custom domain
-            domain = apigatewayv2.DomainName(
-                self,
-                "ApiCustomDomain",
-                domain_name=custom_domain_name,
-                certificate=certificate,
-            )
-            
-            # Map the domain to the API
-            apigatewayv2.ApiMapping(
-                self,
-                "ApiMapping",
-                api=self.api,
-                domain_name=domain,
-                stage=self.api.default_stage,
-            )
-            
-            # Output the custom domain URL
-            CfnOutput(
-                self,
-                "CustomDomainUrl",
-                value=f"https://{custom_domain_name}",
-                description="Custom domain URL for the API",
-            )
+        if custom_domain_name and certificate:
+            outputs.append(self._add_custom_domain(custom_domain_name, certificate))
 
         #########################################
         ########### Create the log group #######
         #########################################
 
-        log_group = logs.LogGroup(
+        # HTTP APIs only deliver access logs to CloudWatch Logs (no Firehose
+        # destination as for REST APIs). For high request rates, the
+        # INFREQUENT_ACCESS class halves the ingestion price.
+        log_group = create_log_group(
             self,
             "HttpApiLogGroup",
             log_group_name="/aws/vendedlogs/apigateway/vis-assis-http-api",
-            retention=logs.RetentionDays.ONE_WEEK,
-            removal_policy=RemovalPolicy.DESTROY,
+            log_group_class=access_log_class,
+            retention=access_log_retention,
+            existing_log_group_arn=existing_log_group_arn,
         )
 
         cfn_stage = self.api.default_stage.node.default_child
         cfn_stage.access_log_settings = apigatewayv2.CfnStage.AccessLogSettingsProperty(
             destination_arn=log_group.log_group_arn,
-            format='{"requestId":"$context.requestId", "ip": "$context.identity.sourceIp", "requestTime":"$context.requestTime", "httpMethod":"$context.httpMethod", "routeKey":"$context.routeKey", "status":"$context.status", "protocol":"$context.protocol", "responseLength":"$context.responseLength"}',
+            format=ACCESS_LOG_FORMAT,
         )
 
         log_group.grant_write(iam.ServicePrincipal("apigateway.amazonaws.com"))
 
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_API_GATEWAY_ENDPOINT,
-            value=self.api.api_endpoint,
-            description="API Gateway endpoint",
-            export_name=shared_variables.CDK_OUT_EXPORT_API_GATEWAY_ENDPOINT,
+        #########################################
+        ########### CloudFront (Optional) #######
+        #########################################
+
+        # The API stays regional, CloudFront terminates TLS at the closest edge
+        # location and forwards the requests to it
+        self.distribution = None
+        self.endpoint = self.api.api_endpoint
+        if enable_edge_cache:
+            from aws_cdk import aws_cloudfront as cloudfront
+            from aws_cdk import aws_cloudfront_origins as origins
+
+            # The managed CACHING_DISABLED policy plus ALL_VIEWER_EXCEPT_HOST_HEADER
+            # drops the Authorization header on GET/HEAD requests. Adding it to the
+            # cache key forwards it, the zero default TTL keeps responses uncached
+            if edge_cache_policy is None:
+                edge_cache_policy = cloudfront.CachePolicy(
+                    self,
+                    "ApiCachePolicy",
+                    comment="Forward the Authorization header to the vis-assis HTTP API",
+                    header_behavior=cloudfront.CacheHeaderBehavior.allow_list(
+                        "Authorization"
+                    ),
+                    query_string_behavior=cloudfront.CacheQueryStringBehavior.all(),
+                    min_ttl=Duration.seconds(0),
+                    default_ttl=Duration.seconds(0),
+                    max_ttl=Duration.seconds(1),
+                )
+
+            self.distribution = cloudfront.Distribution(
+                self,
+                "ApiDistribution",
+                comment="Edge entry point for the vis-assis HTTP API",
+                default_behavior=cloudfront.BehaviorOptions(
+                    origin=origins.HttpOrigin(
+                        f"{self.api.api_id}.execute-api.{Aws.REGION}.amazonaws.com"
+                    ),
+                    allowed_methods=cloudfront.AllowedMethods.ALLOW_ALL,
+                    viewer_protocol_policy=cloudfront.ViewerProtocolPolicy.HTTPS_ONLY,
+                    cache_policy=edge_cache_policy,
+                    origin_request_policy=cloudfront.OriginRequestPolicy.ALL_VIEWER_EXCEPT_HOST_HEADER,
+                ),
+            )
+
+            add_nag_suppressions(
+                self.distribution,
+                [
+                    {
+                        "id": "AwsSolutions-CFR1",
+                        "reason": "The API is protected by Cognito, geo restrictions are not needed in aws samples",
+                    },
+                    {
+                        "id": "AwsSolutions-CFR2",
+                        "reason": "WAF integration is not required for aws samples",
+                    },
+                    {
+                        "id": "AwsSolutions-CFR3",
+                        "reason": "Requests are already logged by the API Gateway access logs",
+                    },
+                    {
+                        "id": "AwsSolutions-CFR4",
+                        "reason": "The default CloudFront certificate is used when no custom domain is provided",
+                    },
+                ],
+            )
+
+            self.endpoint = f"https://{self.distribution.distribution_domain_name}"
+
+        # Read by its output key (format-outputs.sh), no export needed
+        outputs.append(
+            (
+                shared_variables.CDK_OUT_KEY_API_GATEWAY_ENDPOINT,
+                self.endpoint,
+                None,
+                "API Gateway endpoint",
+            )
         )
+        emit_outputs(self, outputs)
 
-        #################################################################
-        ####### Invoke SageMaker real-time inference endpoint ###########
-        #################################################################
+        #########################################
+        ########### Routes ######################
+        #########################################
 
-        self.api.add_routes(
-            integration=HttpLambdaIntegration(
-                "InvokeSageMakerEndpoint", lambda_invoke_sagemaker
+        # (path, method, lambda function, integration id)
+        # - Invoke SageMaker real-time inference endpoint
+        # - Pre-signed URL model artifacts
+        routes = [
+            (
+                "/invokesagemakerinference",
+                HTTP_METHOD_POST,
+                lambda_invoke_sagemaker,
+                "InvokeSageMakerEndpoint",
             ),
-            path="/invokesagemakerinference",
-            methods=[apigatewayv2.HttpMethod.POST],
-            authorizer=authorizer,
-        )
+            (
+                "/getmodelurl",
+                HTTP_METHOD_GET,
+                lambda_models_url,
+                "GetModelArtifactIntegration",
+            ),
+        ]
+
+        # All routes share the same authorizer instance, so it is bound to the
+        # API only once. Routes without function (SageMaker skipped) are not added
+        for path, method, function, integration_id in routes:
+            if function is None:
+                continue
+            # Keep initialized execution environments to avoid cold starts
+            if prewarm_concurrency:
+                function = lambda_.Alias(
+                    self,
+                    f"{integration_id}Live",
+                    alias_name="live",
+                    version=function.current_version,
+                    provisioned_concurrent_executions=prewarm_concurrency,
+                )
+            self.api.add_routes(
+                integration=self._integration_for(integration_id, function),
+                path=path,
+                methods=[method],
+                authorizer=authorizer,
+            )
 
         # Create VPC link as function is within the VPC
         # https://docs.aws.amazon.com/apigateway/latest/developerguide/http-api-vpc-links.html
-        # Only supports some AZs, it needs to be checked here before
-        available_zones = shared_variables.AVAILABILITY_ZONES
+        # Only supports some AZs, the subnets are selected by the caller
         vpc_link = apigatewayv2.VpcLink(
             self,
             "VpcLink",
             vpc=vpc_invoke_sagemaker,
-            subnets=ec2.SubnetSelection(
-                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS,
-                subnet_filters=[ec2.SubnetFilter.availability_zones(available_zones)],
-            ),
+            subnets=ec2.SubnetSelection(subnets=vpc_link_subnets),
+        )
+
+    def _add_custom_domain(
+        self, custom_domain_name: str, certificate: "acm.ICertificate"
+    ):
+        # Create custom domain
+        domain = apigatewayv2.DomainName(
+            self,
+            "ApiCustomDomain",
+            domain_name=custom_domain_name,
+            certificate=certificate,
         )
 
-        ##################################################
-        ####### Pre-signed URL model artifacts ###########
-        ##################################################
+        # Map the domain to the API
+        apigatewayv2.ApiMapping(
+            self,
+            "ApiMapping",
+            api=self.api,
+            domain_name=domain,
+            stage=self.api.default_stage,
+        )
 
-        self.api.add_routes(
-            integration=HttpLambdaIntegration(
-                "GetModelArtifactIntegration", lambda_models_url
-            ),
-            path="/getmodelurl",
-            methods=[apigatewayv2.HttpMethod.GET],
-            authorizer=authorizer,
+        # Custom domain URL output (key, value, export name, description)
+        return (
+            "CustomDomainUrl",
+            f"https://{custom_domain_name}",
+            None,
+            "Custom domain URL for the API",
         )
 
+    def _integration_for(
+        self, integration_id: str, function: lambda_.IFunction
+    ) -> "HttpLambdaIntegration":
+        from aws_cdk.aws_apigatewayv2_integrations import HttpLambdaIntegration
+
+        # Routes targeting the same function share a single integration
+        integration = self._integrations.get(function.function_arn)
+        if integration is None:
+            integration = HttpLambdaIntegration(integration_id, function)
+            self._integrations[function.function_arn] = integration
+        return integration
+
     def get_url(self):
+        if self.distribution:
+            return f"{self.endpoint}/"
         return self.api.url
@@ -2,11 +2,13 @@
 # SPDX-License-Identifier: MIT-0
 
 import shared_variables as shared_variables
-from aws_cdk import CfnOutput, Duration, RemovalPolicy
+from aws_cdk import Duration, RemovalPolicy
 from aws_cdk import aws_cognito as cognito
-from cdk_nag import NagPackSuppression, NagSuppressions
 from constructs import Construct
 
+from resources.nag_suppressions import add_nag_suppressions
+from resources.outputs import emit_outputs
+
 
 class CognitoConstruct(Construct):
 
@@ -15,6 +17,10 @@ class CognitoConstruct(Construct):
         scope: Construct,
         construct_id: str,
         region: str,
+        allow_user_password_auth: bool = False,
+        allow_admin_user_password_auth: bool = False,
+        allow_custom_auth: bool = False,
+        advanced_security_mode: str = "ENFORCED",
         **kwargs,
     ):
         super().__init__(scope, construct_id, **kwargs)
@@ -48,43 +54,58 @@ class CognitoConstruct(Construct):
             ),
             removal_policy=RemovalPolicy.DESTROY,
         )
-        self.user_pool.node.default_child.user_pool_add_ons = (
-            cognito.CfnUserPool.UserPoolAddOnsProperty(
-                advanced_security_mode="ENFORCED",
+        # "OFF" skips the add-ons (no risk evaluation on each sign-in)
+        if advanced_security_mode != "OFF":
+            self.user_pool.node.default_child.user_pool_add_ons = (
+                cognito.CfnUserPool.UserPoolAddOnsProperty(
+                    advanced_security_mode=advanced_security_mode,
+                )
             )
-        )
-        NagSuppressions.add_resource_suppressions(
-            construct=self.user_pool,
-            suppressions=[
-                NagPackSuppression(
-                    id="AwsSolutions-COG2",
-                    reason="MFA not required for Cognito in aws samples",
-                ),
-            ],
-        )
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_COGNITO_USER_POOL_ID,
-            value=self.user_pool.user_pool_id,
-            export_name=shared_variables.CDK_OUT_EXPORT_COGNITO_USER_POOL_ID,
-        )
-
+        suppressions = [
+            {
+                "id": "AwsSolutions-COG2",
+                "reason": "MFA not required for Cognito in aws samples",
+            },
+        ]
+        if advanced_security_mode != "ENFORCED":
+            suppressions.append(
+                {
+                    "id": "AwsSolutions-COG3",
+                    "reason": "Advanced security is only enforced for production stacks",
+                }
+            )
+        add_nag_suppressions(self.user_pool, suppressions)
         self.user_pool_client = cognito.UserPoolClient(
             self,
             "UserPoolClient",
             user_pool=self.user_pool,
+            # The frontend (Amplify Authenticator) signs in with SRP, other
+            # flows are only enabled on demand
             auth_flows=cognito.AuthFlow(
-                user_password=True,
                 user_srp=True,
-                admin_user_password=True,
-                custom=True,
+                user_password=allow_user_password_auth,
+                admin_user_password=allow_admin_user_password_auth,
+                custom=allow_custom_auth,
             ),
         )
-        CfnOutput(
+
+        # Read by their output keys (format-outputs.sh), no export needed
+        emit_outputs(
             self,
-            shared_variables.CDK_OUT_KEY_COGNITO_USER_POOL_CLIENT_ID,
-            value=self.user_pool_client.user_pool_client_id,
-            export_name=shared_variables.CDK_OUT_EXPORT_COGNITO_USER_POOL_CLIENT_ID,
+            [
+                (
+                    shared_variables.CDK_OUT_KEY_COGNITO_USER_POOL_ID,
+                    self.user_pool.user_pool_id,
+                    None,
+                    None,
+                ),
+                (
+                    shared_variables.CDK_OUT_KEY_COGNITO_USER_POOL_CLIENT_ID,
+                    self.user_pool_client.user_pool_client_id,
+                    None,
+                    None,
+                ),
+            ],
         )
 
     def getUserPool(self):
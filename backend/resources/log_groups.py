@@ -0,0 +1,36 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import typing
+
+from aws_cdk import RemovalPolicy
+from aws_cdk import aws_logs as logs
+from constructs import Construct
+
+
+def create_log_group(
+    scope: Construct,
+    construct_id: str,
+    *,
+    log_group_name: str,
+    retention: logs.RetentionDays = logs.RetentionDays.ONE_WEEK,
+    existing_log_group_arn: typing.Optional[str] = None,
+    **kwargs,
+) -> logs.ILogGroup:
+    """
+    Create a log group destroyed with the stack, or import it when
+    existing_log_group_arn is provided (no new CloudFormation resource).
+    """
+    if existing_log_group_arn:
+        return logs.LogGroup.from_log_group_arn(
+            scope, construct_id, existing_log_group_arn
+        )
+
+    return logs.LogGroup(
+        scope,
+        construct_id,
+        log_group_name=log_group_name,
+        retention=retention,
+        removal_policy=RemovalPolicy.DESTROY,
+        **kwargs,
+    )
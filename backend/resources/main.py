@@ -13,10 +13,10 @@
 # IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
 # CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 
-import json
+import functools
+from typing import TYPE_CHECKING, Optional
 
-import shared_variables as shared_variables
-from aws_cdk import Aws, CfnOutput, Duration, RemovalPolicy, Stack
+from aws_cdk import CfnOutput, CustomResource, Duration, RemovalPolicy, Stack
 from aws_cdk import aws_ec2 as ec2
 from aws_cdk import aws_events as events
 from aws_cdk import aws_events_targets as targets
@@ -24,42 +24,85 @@ from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda as lambda_
 from aws_cdk import aws_logs as logs
 from aws_cdk import aws_s3 as s3
-from aws_cdk import aws_sagemaker as sagemaker
 from aws_cdk import custom_resources as cr
-from cdk_nag import NagSuppressions
 from constructs import Construct
+from shared_variables import (
+    AVAILABILITY_ZONES,
+    CDK_OUT_EXPORT_REGION,
+    CDK_OUT_EXPORT_S3_BUCKET_PRODUCTION_MODELS_NAME,
+    CDK_OUT_EXPORT_S3_BUCKET_SAGEMAKER_INPUT_NAME,
+    CDK_OUT_EXPORT_S3_BUCKET_SAGEMAKER_OUTPUT_NAME,
+    CDK_OUT_EXPORT_SAGEMAKER_EXECUTION_ROLE_ARN,
+    CDK_OUT_EXPORT_SAGEMAKER_PUBLISH_MODEL_FUNCTION_ARN,
+    CDK_OUT_KEY_REGION,
+    CDK_OUT_KEY_S3_BUCKET_PRODUCTION_MODELS_NAME,
+    CDK_OUT_KEY_S3_BUCKET_SAGEMAKER_INPUT_NAME,
+    CDK_OUT_KEY_S3_BUCKET_SAGEMAKER_OUTPUT_NAME,
+    CDK_OUT_KEY_SAGEMAKER_EXECUTION_ROLE_ARN,
+    CDK_OUT_KEY_SAGEMAKER_PUBLISH_MODEL_FUNCTION_ARN,
+    ENABLE_CDK_NAG,
+    STACK_NAME,
+    STACK_NAME_DEV,
+)
 
 import resources.apigateway.apigateway_construct as apigateway_construct
 import resources.cognito.cognito_construct as cognito_construct
 import resources.sagemaker.sagemakerdomain as sagemakerdomain
-from resources.sagemaker.sagemakerendpoint.paligemma_endpoint_construct import \
-    PaLiGemmaEndpointConstruct
+from resources.log_groups import create_log_group
+from resources.managed_policies import aws_managed_policy
+from resources.nag_suppressions import (
+    PROVIDER_FRAMEWORK_SUPPRESSIONS,
+    add_nag_suppressions,
+)
+from resources.outputs import emit_outputs
+from resources.sagemaker.sagemakerendpoint.paligemma_endpoint_construct import (
+    PaLiGemmaEndpointConstruct,
+)
+
+# Only imported when a certificate ARN is provided, see import_certificate
+if TYPE_CHECKING:
+    from aws_cdk import aws_certificatemanager as acm
+
+
+@functools.lru_cache(maxsize=None)
+def import_certificate(scope: Stack, certificate_arn: str) -> "acm.ICertificate":
+    # Imported once per (stack, ARN), constructs sharing a certificate reuse it
+    from aws_cdk import aws_certificatemanager as acm
+
+    return acm.Certificate.from_certificate_arn(
+        scope, "ApiCertificate", certificate_arn
+    )
 
 
 class MyStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        suffix_S3_str = Aws.ACCOUNT_ID
+        # Shared by the functions created with _make_lambda
+        self._core_functions_code = None
+
+        # (path, suppressions) applied at the end of the stack, see _suppress_by_path
+        self._path_suppressions = []
+
+        # Literal account ID when the stack is bound to an environment (see app.py)
+        suffix_S3_str = self.account
+
+        # The stack is the scope of every suppression below, its logical IDs
+        # are resolved through this bound method
+        logical_id = self.get_logical_id
 
         CUSTOM_ALLOWED_RESOURCES = ["*"]
 
-        NagSuppressions.add_stack_suppressions(
+        add_nag_suppressions(
             self,
             [
                 {
                     "id": "AwsSolutions-IAM4",
-                    "reason": "The LogRetention construct requires the AWSLambdaBasicExecutionRole managed policy",
+                    "reason": "Lambda functions created with their default role use the AWSLambdaBasicExecutionRole managed policy",
                     "appliesTo": [
                         "Policy::arn:<AWS::Partition>:iam::aws:policy/service-role/AWSLambdaBasicExecutionRole"
                     ],
-                }
-            ],
-        )
-
-        NagSuppressions.add_stack_suppressions(
-            self,
-            [
+                },
                 {
                     "id": "AwsSolutions-IAM5",
                     "reason": "IAM wildcards are needed for SageMaker and other services to function properly",
@@ -91,6 +134,43 @@ class MyStack(Stack):
         custom_domain_name = self.node.try_get_context("custom_domain_name")
         certificate_arn = self.node.try_get_context("certificate_arn")
 
+        # Optional CloudFront distribution in front of the regional API:
+        # --context enable_edge_cache=y
+        enable_edge_cache = str(self.node.try_get_context("enable_edge_cache")) == "y"
+
+        # Optional provisioned concurrency for the Lambda functions behind the API:
+        # --context prewarm_concurrency=1
+        prewarm_concurrency = int(self.node.try_get_context("prewarm_concurrency") or 0)
+
+        # Optional cheaper log class for the API access logs (changing it on an
+        # existing stack replaces the log group): --context infrequent_access_logs=y
+        infrequent_access_logs = (
+            str(self.node.try_get_context("infrequent_access_logs")) == "y"
+        )
+
+        # Buckets are emptied and deleted with the stack by default, which deploys the
+        # auto delete objects custom resource. To keep them (and skip that custom
+        # resource), e.g. for production: --context ephemeral=n
+        ephemeral = str(self.node.try_get_context("ephemeral")) != "n"
+        bucket_removal_policy = (
+            RemovalPolicy.DESTROY if ephemeral else RemovalPolicy.RETAIN
+        )
+
+        # Skip the SageMaker domain, endpoint and model registry resources (and the
+        # functions depending on them), e.g. for `cdk ls` or CI synths:
+        # --context skip_sagemaker=y
+        skip_sagemaker = str(self.node.try_get_context("skip_sagemaker")) == "y"
+
+        # Serve PaLiGemma with SageMaker Async Inference, scaled to zero when idle
+        # (the first request after an idle period waits for an instance):
+        # --context paligemma_async=y
+        paligemma_async = str(self.node.try_get_context("paligemma_async")) == "y"
+
+        # Bake the PaLiGemma weights in a private image built from docker/paligemma
+        # instead of downloading them from S3 (see the README):
+        # --context paligemma_image=y
+        paligemma_image = str(self.node.try_get_context("paligemma_image")) == "y"
+
         if import_existing_s3_buckets_cli == "y":
             print("🪣 Importing existing S3 buckets")
             import_existing_s3_buckets = True
@@ -128,14 +208,27 @@ class MyStack(Stack):
             )
             cors_allowed_origins.extend(base_origins)
 
+        # Built once, referenced by every bucket served to the frontend
+        shared_cors_rule = s3.CorsRule(
+            allowed_methods=[s3.HttpMethods.GET, s3.HttpMethods.POST],
+            exposed_headers=["ETag"],
+            allowed_origins=cors_allowed_origins,
+            allowed_headers=[
+                "Authorization",
+                "Content-Type",
+                "If-None-Match",
+            ],
+            max_age=3600,
+        )
+
         ####### METADATA ########
 
         CfnOutput(
             self,
-            shared_variables.CDK_OUT_KEY_REGION,
+            CDK_OUT_KEY_REGION,
             value=self.region,
             description="Region of the stack.",
-            export_name=shared_variables.CDK_OUT_EXPORT_REGION,
+            export_name=CDK_OUT_EXPORT_REGION,
         )
 
         ########## VPC ############
@@ -166,140 +259,80 @@ class MyStack(Stack):
             description="Security group for the stack VPC",
         )
 
-        #! AwsSolutions-VPC7: The VPC does not have an associated Flow Log.
-        # Create a log group for VPC Flow Logs
-        log_group = logs.LogGroup(
-            self,
-            "VPCFlowLogsGroup",
-            log_group_name="/aws/vpc/vis-assis-flow-logs",
-            retention=logs.RetentionDays.ONE_MONTH,
-            removal_policy=RemovalPolicy.DESTROY,
-        )
+        # Only needed alongside the SageMaker domain (see skip_sagemaker)
+        if not skip_sagemaker:
+            # Sagemaker domain creates custom security groups which rises issues when destroying the stack.
+            # We create a custom resource to delete them ensuring no remaining resources or failed state after destruction.
 
-        # Create a role for VPC Flow Logs
-        flow_logs_role = iam.Role(
-            self,
-            "VPCFlowLogsRole",
-            assumed_by=iam.ServicePrincipal("vpc-flow-logs.amazonaws.com"),
-        )
-
-        # Add necessary permissions to the role
-        flow_logs_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "logs:CreateLogStream",
-                    "logs:PutLogEvents",
-                ],
-                resources=[log_group.log_group_arn, f"{log_group.log_group_arn}:*"],
+            delete_sg_lambda = lambda_.Function(
+                self,
+                "DeleteSGLambda",
+                runtime=lambda_.Runtime.PYTHON_3_13,
+                handler="lambda.handler",
+                code=lambda_.Code.from_asset("functions/cleanup/delete_sm_sgs/src"),
+                timeout=Duration.minutes(15),
             )
-        )
 
-        # Add Flow Logs to the VPC
-        stack_vpc.add_flow_log(
-            "FlowLog",
-            destination=ec2.FlowLogDestination.to_cloud_watch_logs(
-                log_group, flow_logs_role
-            ),
-            traffic_type=ec2.FlowLogTrafficType.ALL,
-        )
-
-        NagSuppressions.add_resource_suppressions_by_path(
-            Stack.of(self),
-            f"{self.node.path}/VPCFlowLogsRole/DefaultPolicy/Resource",
-            [
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "VPC Flow Logs needs permissions to write to all log streams in the log group",
-                    "appliesTo": [
-                        f"Resource::<{Stack.of(self).get_logical_id(log_group.node.default_child)}.Arn>:*"
-                    ],
-                }
-            ],
-        )
-        # Sagemaker domain creates custom security groups which rises issues when destroying the stack.
-        # We create a custom resource to delete them ensuring no remaining resources or failed state after destruction.
-
-        delete_sg_lambda = lambda_.Function(
-            self,
-            "DeleteSGLambda",
-            runtime=lambda_.Runtime.PYTHON_3_13,
-            handler="lambda.handler",
-            code=lambda_.Code.from_asset("functions/cleanup/delete_sm_sgs/src"),
-            timeout=Duration.minutes(15),
-        )
-
-        delete_sg_lambda.add_to_role_policy(
-            iam.PolicyStatement(
-                actions=["ec2:DescribeSecurityGroups"],
-                resources=["*"],  # does not support resource based policy
+            delete_sg_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=["ec2:DescribeSecurityGroups"],
+                    resources=["*"],  # does not support resource based policy
+                )
             )
-        )
 
-        NagSuppressions.add_resource_suppressions_by_path(
-            Stack.of(self),
-            f"{self.node.path}/DeleteSGLambda/ServiceRole/DefaultPolicy/Resource",
-            [
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "DescribeSecurityGroups API does not support resource-level permissions and requires a wildcard",
-                    "appliesTo": [
-                        f"Resource::arn:aws:ec2:<AWS::Region>:<AWS::AccountId>:security-group/*"
+            delete_sg_lambda.add_to_role_policy(
+                iam.PolicyStatement(
+                    actions=[
+                        "ec2:RevokeSecurityGroupIngress",
+                        "ec2:RevokeSecurityGroupEgress",
+                        "ec2:DeleteSecurityGroup",
                     ],
-                }
-            ],
-        )
+                    resources=[
+                        f"arn:aws:ec2:{self.region}:{self.account}:security-group/*"
+                    ],
+                    conditions={"ArnEquals": {"ec2:Vpc": f"{stack_vpc.vpc_arn}"}},
+                )
+            )
 
-        delete_sg_lambda.add_to_role_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "ec2:RevokeSecurityGroupIngress",
-                    "ec2:RevokeSecurityGroupEgress",
-                    "ec2:DeleteSecurityGroup",
-                ],
-                resources=[
-                    f"arn:aws:ec2:{self.region}:{self.account}:security-group/*"
+            self._suppress_by_path(
+                f"{self.node.path}/DeleteSGLambda/ServiceRole/DefaultPolicy/Resource",
+                [
+                    {
+                        "id": "AwsSolutions-IAM5",
+                        "reason": "DescribeSecurityGroups API does not support resource-level permissions and requires a wildcard",
+                        "appliesTo": [
+                            f"Resource::arn:aws:ec2:<AWS::Region>:<AWS::AccountId>:security-group/*"
+                        ],
+                    },
+                    {
+                        "id": "AwsSolutions-IAM5",
+                        "reason": "Lambda needs to manage security groups within the specific VPC. Access is restricted to specific VPC using conditions.",
+                        "appliesTo": [
+                            f"Resource::arn:aws:ec2:{self.region}:{self.account}:security-group/*"
+                        ],
+                    },
                 ],
-                conditions={"ArnEquals": {"ec2:Vpc": f"{stack_vpc.vpc_arn}"}},
             )
-        )
 
-        NagSuppressions.add_resource_suppressions_by_path(
-            Stack.of(self),
-            f"{self.node.path}/DeleteSGLambda/ServiceRole/DefaultPolicy/Resource",
-            [
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "Lambda needs to manage security groups within the specific VPC. Access is restricted to specific VPC using conditions.",
-                    "appliesTo": [
-                        f"Resource::arn:aws:ec2:{self.region}:{self.account}:security-group/*"
-                    ],
-                }
-            ],
-        )
+            # The Lambda is the on event handler of the custom resource, it only acts on stack deletion
+            delete_sg_provider = cr.Provider(
+                self,
+                "DeleteSGProvider",
+                on_event_handler=delete_sg_lambda,
+            )
 
-        # Create a custom resource that will invoke the Lambda
-        delete_sg_custom_resource = cr.AwsCustomResource(
-            self,
-            "DeleteSGCustomResource",
-            timeout=Duration.minutes(15),
-            on_delete=cr.AwsSdkCall(
-                service="Lambda",
-                action="invoke",
-                parameters={
-                    "FunctionName": delete_sg_lambda.function_name,
-                    "Payload": json.dumps({"vpc_id": stack_vpc.vpc_id}),
-                },
-                physical_resource_id=cr.PhysicalResourceId.of(stack_vpc.vpc_id),
-            ),
-            policy=cr.AwsCustomResourcePolicy.from_statements(
-                [
-                    iam.PolicyStatement(
-                        actions=["lambda:InvokeFunction"],
-                        resources=[delete_sg_lambda.function_arn],
-                    )
-                ]
-            ),
-        )
+            add_nag_suppressions(
+                delete_sg_provider,
+                list(PROVIDER_FRAMEWORK_SUPPRESSIONS),
+                apply_to_children=True,
+            )
+
+            delete_sg_custom_resource = CustomResource(
+                self,
+                "DeleteSGCR",
+                service_token=delete_sg_provider.service_token,
+                properties={"vpc_id": stack_vpc.vpc_id},
+            )
 
         ########## S3 BUCKETS #############
 
@@ -311,200 +344,241 @@ class MyStack(Stack):
             encryption=s3.BucketEncryption.S3_MANAGED,
             enforce_ssl=True,
             block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
-            removal_policy=RemovalPolicy.DESTROY,
-            auto_delete_objects=True,
+            removal_policy=bucket_removal_policy,
+            auto_delete_objects=ephemeral,
         )
 
-        # Create the S3 bucket for storing Sagemaker input resources (training data, etc.)
-        if import_existing_s3_buckets:
-            sagemaker_input_bucket = s3.Bucket.from_bucket_name(
-                self,
-                "BucketSagemakerInput",
-                "vis-assis-sagemaker-input-" + suffix_S3_str,
-            )
-        else:
-            sagemaker_input_bucket = s3.Bucket(
-                self,
+        #! AwsSolutions-VPC7: The VPC does not have an associated Flow Log.
+        # Flow logs are delivered to the server access logs bucket, no
+        # dedicated log group or IAM role is needed
+        stack_vpc.add_flow_log(
+            "FlowLog",
+            destination=ec2.FlowLogDestination.to_s3(logs_bucket, "vpc-flow-logs/"),
+            traffic_type=ec2.FlowLogTrafficType.ALL,
+        )
+
+        # Buckets for Sagemaker input resources (training data, etc.), Sagemaker output
+        # artifacts (optimised, in the .onnx format) and production model artifacts.
+        # (construct id, bucket name prefix, access logs prefix, CORS rules, output key, output export name, output description)
+        buckets_config = [
+            (
                 "BucketSagemakerInput",
-                block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
-                encryption=s3.BucketEncryption.S3_MANAGED,
-                bucket_name="vis-assis-sagemaker-input-" + suffix_S3_str,
-                removal_policy=RemovalPolicy.DESTROY,
-                auto_delete_objects=True,
-                server_access_logs_bucket=logs_bucket,
-                server_access_logs_prefix="sagemaker-input-logs/",
-                enforce_ssl=True,
+                "vis-assis-sagemaker-input-",
+                "sagemaker-input-logs/",
+                None,
+                CDK_OUT_KEY_S3_BUCKET_SAGEMAKER_INPUT_NAME,
+                CDK_OUT_EXPORT_S3_BUCKET_SAGEMAKER_INPUT_NAME,
+                "The S3 bucket containing the input resources needed for Sagemaker such as training data, etc.",
+            ),
+            (
+                "BucketSagemakerOutput",
+                "vis-assis-sagemaker-output-",
+                "sagemaker-output-logs/",
+                None,
+                CDK_OUT_KEY_S3_BUCKET_SAGEMAKER_OUTPUT_NAME,
+                CDK_OUT_EXPORT_S3_BUCKET_SAGEMAKER_OUTPUT_NAME,
+                "The S3 bucket containing the output job results of Sagemaker",
+            ),
+            (
+                "BucketProductionModelArtifacts",
+                "vis-assis-model-artifacts-production-",
+                "model-artifacts-logs/",
+                [shared_cors_rule],
+                CDK_OUT_KEY_S3_BUCKET_PRODUCTION_MODELS_NAME,
+                CDK_OUT_EXPORT_S3_BUCKET_PRODUCTION_MODELS_NAME,
+                "The S3 bucket containing the model artifacts ready for production",
+            ),
+        ]
+
+        buckets = {}
+        bucket_outputs = []
+        for (
+            bucket_id,
+            bucket_name_prefix,
+            access_logs_prefix,
+            cors_rules,
+            output_key,
+            output_export_name,
+            output_description,
+        ) in buckets_config:
+            bucket_name = bucket_name_prefix + suffix_S3_str
+            if import_existing_s3_buckets:
+                bucket = s3.Bucket.from_bucket_name(self, bucket_id, bucket_name)
+            else:
+                bucket = s3.Bucket(
+                    self,
+                    bucket_id,
+                    block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+                    encryption=s3.BucketEncryption.S3_MANAGED,
+                    bucket_name=bucket_name,
+                    removal_policy=bucket_removal_policy,
+                    auto_delete_objects=ephemeral,
+                    server_access_logs_bucket=logs_bucket,
+                    server_access_logs_prefix=access_logs_prefix,
+                    enforce_ssl=True,
+                    cors=cors_rules,
+                )
+            buckets[bucket_id] = bucket
+            bucket_outputs.append(
+                (output_key, bucket.bucket_name, output_export_name, output_description)
             )
 
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_S3_BUCKET_SAGEMAKER_INPUT_NAME,
-            value=sagemaker_input_bucket.bucket_name,
-            description="The S3 bucket containing the input resources needed for Sagemaker such as training data, etc.",
-            export_name=shared_variables.CDK_OUT_EXPORT_S3_BUCKET_SAGEMAKER_INPUT_NAME,
-        )
+        emit_outputs(self, bucket_outputs)
 
-        # Create the S3 bucket for storing Sagemaker output artifacts. These artifacts are optimised and in the .onnx format
-        if import_existing_s3_buckets:
-            sagemaker_output_bucket = s3.Bucket.from_bucket_name(
-                self,
-                "BucketSagemakerOutput",
-                "vis-assis-sagemaker-output-" + suffix_S3_str,
+        sagemaker_input_bucket = buckets["BucketSagemakerInput"]
+        sagemaker_output_bucket = buckets["BucketSagemakerOutput"]
+        prod_model_artifacts_bucket = buckets["BucketProductionModelArtifacts"]
+
+        ########## SAGEMAKER INIT #############
+
+        self.sagemaker_execution_role = None
+        if not skip_sagemaker:
+            # Create the SageMaker domain, Studio users and model groups
+            self.sagemaker_domain_name = "vis-assis-sagemaker-studio-domain"
+            self.public_subnet_ids = [
+                public_subnet.subnet_id for public_subnet in stack_vpc.public_subnets
+            ]
+            self.sagemaker_domain_users_models_construct = (
+                sagemakerdomain.SagemakerDomainUsersModelGroupsConstruct(
+                    self,
+                    "SagemakerDomainUsersModelGroupsConstruct",
+                    sagemaker_domain_name="vis-assis-sagemaker-domain",
+                    vpc_id=stack_vpc.vpc_id,
+                    subnet_ids=self.public_subnet_ids,
+                )
             )
-        else:
-            sagemaker_output_bucket = s3.Bucket(
+
+            # Create the PaLiGemma endpoint construct
+            paligemma_endpoint = PaLiGemmaEndpointConstruct(
                 self,
-                "BucketSagemakerOutput",
-                block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
-                encryption=s3.BucketEncryption.S3_MANAGED,
-                bucket_name="vis-assis-sagemaker-output-" + suffix_S3_str,
-                removal_policy=RemovalPolicy.DESTROY,
-                auto_delete_objects=True,
-                server_access_logs_bucket=logs_bucket,
-                server_access_logs_prefix="sagemaker-output-logs/",
-                enforce_ssl=True,
-                public_read_access=False,
+                "PaLiGemmaEndpoint",
+                logs_bucket=logs_bucket,
+                sagemaker_domain_arn=self.sagemaker_domain_users_models_construct.sagemaker_domain.attr_domain_arn,
+                instance_type="ml.g5.xlarge",
+                import_existing_s3_bucket=import_existing_s3_buckets,
+                ephemeral=ephemeral,
+                async_inference=paligemma_async,
+                model_image_directory=("docker/paligemma" if paligemma_image else None),
             )
 
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_S3_BUCKET_SAGEMAKER_OUTPUT_NAME,
-            value=sagemaker_output_bucket.bucket_name,
-            description="The S3 bucket containing the output job results of Sagemaker",
-            export_name=shared_variables.CDK_OUT_EXPORT_S3_BUCKET_SAGEMAKER_OUTPUT_NAME,
-        )
+            self.endpoint_name = paligemma_endpoint.endpoint_name
+
+            # SageMaker execution role
 
-        # Create the S3 bucket for storing production model artifacts.
-        if import_existing_s3_buckets:
-            prod_model_artifacts_bucket = s3.Bucket.from_bucket_name(
+            sagemaker_execution_role = iam.Role(
                 self,
-                "BucketProductionModelArtifacts",
-                "vis-assis-model-artifacts-production-" + suffix_S3_str,
+                "SageMakerExecutionRole",
+                assumed_by=iam.ServicePrincipal("sagemaker.amazonaws.com"),
+                managed_policies=[aws_managed_policy("AmazonSageMakerFullAccess")],
             )
-        else:
-            prod_model_artifacts_bucket = s3.Bucket(
-                self,
-                "BucketProductionModelArtifacts",
-                block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
-                encryption=s3.BucketEncryption.S3_MANAGED,
-                bucket_name="vis-assis-model-artifacts-production-" + suffix_S3_str,
-                server_access_logs_bucket=logs_bucket,
-                server_access_logs_prefix="model-artifacts-logs/",
-                enforce_ssl=True,
-                cors=[
-                    s3.CorsRule(
-                        allowed_methods=[s3.HttpMethods.GET, s3.HttpMethods.POST],
-                        exposed_headers=["ETag"],
-                        allowed_origins=cors_allowed_origins,
-                        allowed_headers=[
-                            "Authorization",
-                            "Content-Type",
-                            "If-None-Match",
+            # Constructs of this app get the role itself (static reference) rather
+            # than its exported ARN, the export is only read by the boto3 scripts
+            self.sagemaker_execution_role = sagemaker_execution_role
+
+            #! Add NagSuppressions to suppress AwsSolutions-IAM4 warning for SageMaker execution role
+            add_nag_suppressions(
+                sagemaker_execution_role,
+                [
+                    {
+                        "id": "AwsSolutions-IAM4",
+                        "reason": "SageMaker execution role requires full access to SageMaker services",
+                        "appliesTo": [
+                            "Policy::arn:<AWS::Partition>:iam::aws:policy/AmazonSageMakerFullAccess"
                         ],
-                        max_age=60 * 60,
-                    )
+                    }
                 ],
-                removal_policy=RemovalPolicy.DESTROY,
-                auto_delete_objects=True,
             )
 
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_S3_BUCKET_PRODUCTION_MODELS_NAME,
-            value=prod_model_artifacts_bucket.bucket_name,
-            description="The S3 bucket containing the model artifacts ready for production",
-            export_name=shared_variables.CDK_OUT_EXPORT_S3_BUCKET_PRODUCTION_MODELS_NAME,
-        )
+            sagemaker_input_bucket.grant_read_write(sagemaker_execution_role)
+            sagemaker_output_bucket.grant_read_write(sagemaker_execution_role)
 
-        ########## SAGEMAKER INIT #############
+            # Add Nag suppression for S3 bucket wildcard permissions
+            self._suppress_by_path(
+                f"{self.node.path}/SageMakerExecutionRole/DefaultPolicy/Resource",
+                [
+                    {
+                        "id": "AwsSolutions-IAM5",
+                        "reason": "SageMaker execution role needs full access to input/output S3 buckets",
+                        "appliesTo": [
+                            f"Resource::<{logical_id(sagemaker_input_bucket.node.default_child)}.Arn>/*",
+                            f"Resource::<{logical_id(sagemaker_output_bucket.node.default_child)}.Arn>/*",
+                        ],
+                    }
+                ],
+            )
 
-        # Create the SageMaker domain, Studio users and model groups
-        self.sagemaker_domain_name = "vis-assis-sagemaker-studio-domain"
-        self.public_subnet_ids = [
-            public_subnet.subnet_id for public_subnet in stack_vpc.public_subnets
-        ]
-        self.sagemaker_domain_users_models_construct = (
-            sagemakerdomain.SagemakerDomainUsersModelGroupsConstruct(
+            CfnOutput(
                 self,
-                "SagemakerDomainUsersModelGroupsConstruct",
-                sagemaker_domain_name="vis-assis-sagemaker-domain",
-                vpc_id=stack_vpc.vpc_id,
-                subnet_ids=self.public_subnet_ids,
+                CDK_OUT_KEY_SAGEMAKER_EXECUTION_ROLE_ARN,
+                value=sagemaker_execution_role.role_arn,
+                description="The sagemaker execution role ARN",
+                export_name=CDK_OUT_EXPORT_SAGEMAKER_EXECUTION_ROLE_ARN,
             )
-        )
-
-        # Create the PaLiGemma endpoint construct
-        paligemma_endpoint = PaLiGemmaEndpointConstruct(
-            self,
-            "PaLiGemmaEndpoint",
-            logs_bucket=logs_bucket,
-            sagemaker_domain_arn=self.sagemaker_domain_users_models_construct.sagemaker_domain.attr_domain_arn,
-            instance_type="ml.g5.xlarge",
-            import_existing_s3_bucket=import_existing_s3_buckets,
-        )
 
-        self.endpoint_name = paligemma_endpoint.endpoint_name
-
-        # SageMaker execution role
-
-        sagemaker_execution_role = iam.Role(
-            self,
-            "SageMakerExecutionRole",
-            assumed_by=iam.ServicePrincipal("sagemaker.amazonaws.com"),
-            managed_policies=[
-                iam.ManagedPolicy.from_aws_managed_policy_name(
-                    "AmazonSageMakerFullAccess"
-                )
-            ],
-        )
+            # Invoked by the PublishModel step of the download and pack pipelines
+            publish_model_log_group = create_log_group(
+                self,
+                "PublishModelLogGroup",
+                log_group_name="/aws/lambda/vis-assis-sagemaker-publish-model",
+                retention=logs.RetentionDays.ONE_WEEK,
+            )
 
-        #! Add NagSuppressions to suppress AwsSolutions-IAM4 warning for SageMaker execution role
-        NagSuppressions.add_resource_suppressions(
-            sagemaker_execution_role,
-            [
-                {
-                    "id": "AwsSolutions-IAM4",
-                    "reason": "SageMaker execution role requires full access to SageMaker services",
-                    "appliesTo": [
-                        "Policy::arn:<AWS::Partition>:iam::aws:policy/AmazonSageMakerFullAccess"
-                    ],
-                }
-            ],
-        )
+            function_publish_model = self._make_lambda(
+                "LambdaFunctionSagemakerPublishModel",
+                "vis-assis-sagemaker-publish-model",
+                "handler_publish.handler",
+                {},
+                # Lambda steps of the pipelines run up to 10 minutes
+                timeout=Duration.minutes(10),
+                log_group=publish_model_log_group,
+            )
 
-        sagemaker_input_bucket.grant_read_write(sagemaker_execution_role)
-        sagemaker_output_bucket.grant_read_write(sagemaker_execution_role)
+            sagemaker_output_bucket.grant_read_write(function_publish_model)
+            function_publish_model.grant_invoke(sagemaker_execution_role)
+            self._suppress_by_path(
+                f"{self.node.path}/SageMakerExecutionRole/DefaultPolicy/Resource",
+                [
+                    {
+                        "id": "AwsSolutions-IAM5",
+                        "reason": "The pipelines invoke the publish model function, grant_invoke also allows its versions",
+                        "appliesTo": [
+                            f"Resource::<{logical_id(function_publish_model.node.default_child)}.Arn>:*"
+                        ],
+                    }
+                ],
+            )
 
-        # Add Nag suppression for S3 bucket wildcard permissions
-        NagSuppressions.add_resource_suppressions_by_path(
-            Stack.of(self),
-            f"{self.node.path}/SageMakerExecutionRole/DefaultPolicy/Resource",
-            [
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "SageMaker execution role needs full access to input/output S3 buckets",
-                    "appliesTo": [
-                        f"Resource::<{Stack.of(self).get_logical_id(sagemaker_input_bucket.node.default_child)}.Arn>/*",
-                        f"Resource::<{Stack.of(self).get_logical_id(sagemaker_output_bucket.node.default_child)}.Arn>/*",
-                    ],
-                }
-            ],
-        )
+            self._suppress_by_path(
+                f"{self.node.path}/LambdaFunctionSagemakerPublishModel/ServiceRole/DefaultPolicy/Resource",
+                [
+                    {
+                        "id": "AwsSolutions-IAM5",
+                        "reason": "Lambda function copies the packed models within the SageMaker output bucket",
+                        "appliesTo": [
+                            f"Resource::<{logical_id(sagemaker_output_bucket.node.default_child)}.Arn>/*"
+                        ],
+                    }
+                ],
+            )
 
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_SAGEMAKER_EXECUTION_ROLE_ARN,
-            value=sagemaker_execution_role.role_arn,
-            description="The sagemaker execution role ARN",
-            export_name=shared_variables.CDK_OUT_EXPORT_SAGEMAKER_EXECUTION_ROLE_ARN,
-        )
+            CfnOutput(
+                self,
+                CDK_OUT_KEY_SAGEMAKER_PUBLISH_MODEL_FUNCTION_ARN,
+                value=function_publish_model.function_arn,
+                description="The function copying the packed models of the SageMaker pipelines",
+                export_name=CDK_OUT_EXPORT_SAGEMAKER_PUBLISH_MODEL_FUNCTION_ARN,
+            )
 
         ########## COGNITO ############
 
         cognito_construct_output = cognito_construct.CognitoConstruct(
             self,
             "Cognito",
-            region=Aws.REGION,
+            region=self.region,
+            # Adaptive authentication (risk evaluation on each sign-in) in prod only
+            advanced_security_mode=(
+                "OFF" if STACK_NAME == STACK_NAME_DEV else "ENFORCED"
+            ),
         )
 
         cognito_user_pool = cognito_construct_output.getUserPool()
@@ -512,271 +586,323 @@ class MyStack(Stack):
 
         ########## LAMBDA FUNCTIONS ############
 
-        # Add log group
-        copy_model_log_group = logs.LogGroup(
-            self,
-            "CopyModelLogGroup",
-            log_group_name=f"/aws/lambda/vis-assis-copy-model-from-sagemaker-s3-to-production-s3",
-            retention=logs.RetentionDays.ONE_WEEK,
-            removal_policy=RemovalPolicy.DESTROY,
-        )
+        # Invoked by the API route when the SageMaker endpoint is deployed
+        function_invoke_sagemaker = None
+        if not skip_sagemaker:
+            # Add log group
+            copy_model_log_group = create_log_group(
+                self,
+                "CopyModelLogGroup",
+                log_group_name=f"/aws/lambda/vis-assis-copy-model-from-sagemaker-s3-to-production-s3",
+                retention=logs.RetentionDays.ONE_WEEK,
+            )
 
-        # Create custom role for the copy model function
-        copy_model_role = iam.Role(
-            self,
-            "LambdaFunctionCopyModelRole",
-            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
-        )
+            # Create custom role for the copy model function
+            copy_model_role = iam.Role(
+                self,
+                "LambdaFunctionCopyModelRole",
+                assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            )
 
-        # Add CloudWatch Logs permissions
-        copy_model_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "logs:CreateLogStream",
-                    "logs:PutLogEvents",
-                ],
-                resources=[
-                    f"{copy_model_log_group.log_group_arn}",
-                    f"{copy_model_log_group.log_group_arn}:*",  # For streams within the group
-                ],
+            # Add CloudWatch Logs permissions
+            copy_model_role.add_to_policy(
+                iam.PolicyStatement(
+                    actions=[
+                        "logs:CreateLogStream",
+                        "logs:PutLogEvents",
+                    ],
+                    resources=[
+                        f"{copy_model_log_group.log_group_arn}",
+                        f"{copy_model_log_group.log_group_arn}:*",  # For streams within the group
+                    ],
+                )
             )
-        )
 
-        # Add Nag suppression for CloudWatch Logs wildcard permissions
-        NagSuppressions.add_resource_suppressions_by_path(
-            Stack.of(self),
-            f"{self.node.path}/LambdaFunctionCopyModelRole/DefaultPolicy/Resource",
-            [
+            function_copy_model_from_s3_to_s3 = self._make_lambda(
+                "LambdaFunctionCopyModelFromSagemakerS3ToProductionS3",
+                "vis-assis-copy_model_from_sagemaker_s3_to_production_s3",
+                "handler_copy.handler",
                 {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "Lambda function needs permissions to write to all log streams within its log group",
-                    "appliesTo": [
-                        f"Resource::<{Stack.of(self).get_logical_id(copy_model_log_group.node.default_child)}.Arn>:*"
-                    ],
-                }
-            ],
-        )
+                    "DESTINATION_BUCKET_NAME": prod_model_artifacts_bucket.bucket_name  # Set bucket name as environment variable
+                },
+                role=copy_model_role,
+                timeout=Duration.minutes(14),
+                log_group=copy_model_log_group,
+            )
 
-        function_copy_model_from_s3_to_s3 = lambda_.Function(
-            self,
-            "LambdaFunctionCopyModelFromSagemakerS3ToProductionS3",
-            runtime=lambda_.Runtime.PYTHON_3_13,
-            handler="lambda.handler",
-            code=lambda_.Code.from_asset(
-                "functions/setup/copy_from_sm_s3_to_prod_s3/src"
-            ),
-            function_name="vis-assis-copy_model_from_sagemaker_s3_to_production_s3",
-            timeout=Duration.minutes(14),
-            environment={
-                "DESTINATION_BUCKET_NAME": prod_model_artifacts_bucket.bucket_name  # Set bucket name as environment variable
-            },
-            log_group=copy_model_log_group,
-            role=copy_model_role,
-        )
+            sagemaker_output_bucket.grant_read(function_copy_model_from_s3_to_s3)
+            prod_model_artifacts_bucket.grant_read_write(
+                function_copy_model_from_s3_to_s3
+            )
 
-        sagemaker_output_bucket.grant_read(function_copy_model_from_s3_to_s3)
-        prod_model_artifacts_bucket.grant_read_write(function_copy_model_from_s3_to_s3)
+            # Add Nag suppressions for CloudWatch Logs and S3 bucket wildcard permissions
+            self._suppress_by_path(
+                f"{self.node.path}/LambdaFunctionCopyModelRole/DefaultPolicy/Resource",
+                [
+                    {
+                        "id": "AwsSolutions-IAM5",
+                        "reason": "Lambda function needs permissions to write to all log streams within its log group",
+                        "appliesTo": [
+                            f"Resource::<{logical_id(copy_model_log_group.node.default_child)}.Arn>:*"
+                        ],
+                    },
+                    {
+                        "id": "AwsSolutions-IAM5",
+                        "reason": "Lambda function needs full access to S3 buckets to copy model files",
+                        "appliesTo": [
+                            f"Resource::<{logical_id(sagemaker_output_bucket.node.default_child)}.Arn>/*",
+                            f"Resource::<{logical_id(prod_model_artifacts_bucket.node.default_child)}.Arn>/*",
+                        ],
+                    },
+                ],
+            )
 
-        # Add Nag suppression for S3 bucket wildcard permissions
-        NagSuppressions.add_resource_suppressions_by_path(
-            Stack.of(self),
-            f"{self.node.path}/LambdaFunctionCopyModelRole/DefaultPolicy/Resource",
-            [
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "Lambda function needs full access to S3 buckets to copy model files",
-                    "appliesTo": [
-                        f"Resource::<{Stack.of(self).get_logical_id(sagemaker_output_bucket.node.default_child)}.Arn>/*",
-                        f"Resource::<{Stack.of(self).get_logical_id(prod_model_artifacts_bucket.node.default_child)}.Arn>/*",
-                    ],
-                }
-            ],
-        )
+            """ """  #! AwsSolutions-IAM4[Policy::arn:<AWS::Partition>:iam::aws:policy/service-role/AWSLambdaVPCAccessExecutionRole]
+            invoke_sagemaker_role = iam.Role(
+                self,
+                "LambdaFunctionInvokeSagemakerRole",
+                assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            )
 
-        """ """  #! AwsSolutions-IAM4[Policy::arn:<AWS::Partition>:iam::aws:policy/service-role/AWSLambdaVPCAccessExecutionRole]
-        invoke_sagemaker_role = iam.Role(
-            self,
-            "LambdaFunctionInvokeSagemakerRole",
-            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
-        )
+            # Add log group
+            invoke_log_group = create_log_group(
+                self,
+                "LogGroup",
+                log_group_name=f"/aws/lambda/vis-assis-invoke-sagemaker-endpoint",
+                retention=logs.RetentionDays.ONE_WEEK,
+            )
 
-        # Add log group
-        invoke_log_group = logs.LogGroup(
-            self,
-            "LogGroup",
-            log_group_name=f"/aws/lambda/vis-assis-invoke-sagemaker-endpoint",
-            retention=logs.RetentionDays.ONE_WEEK,
-            removal_policy=RemovalPolicy.DESTROY,
-        )
+            # Add CloudWatch Logs permissions
+            invoke_sagemaker_role.add_to_policy(
+                iam.PolicyStatement(
+                    actions=[
+                        "logs:CreateLogStream",
+                        "logs:PutLogEvents",
+                    ],
+                    resources=[
+                        f"{invoke_log_group.log_group_arn}",
+                        f"{invoke_log_group.log_group_arn}:*",  # For streams within the group
+                    ],
+                )
+            )
 
-        # Add CloudWatch Logs permissions
-        invoke_sagemaker_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "logs:CreateLogStream",
-                    "logs:PutLogEvents",
-                ],
-                resources=[
-                    f"{invoke_log_group.log_group_arn}",
-                    f"{invoke_log_group.log_group_arn}:*",  # For streams within the group
+            # Add Nag suppression for CloudWatch Logs wildcard permissions
+            self._suppress_by_path(
+                f"{self.node.path}/LambdaFunctionInvokeSagemakerRole/DefaultPolicy/Resource",
+                [
+                    {
+                        "id": "AwsSolutions-IAM5",
+                        "reason": "Lambda function needs permissions to write to all log streams within its log group",
+                        "appliesTo": [
+                            f"Resource::<{logical_id(invoke_log_group.node.default_child)}.Arn>:*"
+                        ],
+                    }
                 ],
             )
-        )
 
-        # Add Nag suppression for CloudWatch Logs wildcard permissions
-        NagSuppressions.add_resource_suppressions_by_path(
-            Stack.of(self),
-            f"{self.node.path}/LambdaFunctionInvokeSagemakerRole/DefaultPolicy/Resource",
-            [
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "Lambda function needs permissions to write to all log streams within its log group",
-                    "appliesTo": [
-                        f"Resource::<{Stack.of(self).get_logical_id(invoke_log_group.node.default_child)}.Arn>:*"
+            # Add SageMaker InvokeEndpoint permission
+            invoke_sagemaker_role.add_to_policy(
+                iam.PolicyStatement(
+                    actions=[
+                        (
+                            "sagemaker:InvokeEndpointAsync"
+                            if paligemma_async
+                            else "sagemaker:InvokeEndpoint"
+                        )
                     ],
-                }
-            ],
-        )
-
-        # Add SageMaker InvokeEndpoint permission
-        invoke_sagemaker_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=["sagemaker:InvokeEndpoint"],
-                resources=[
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{self.endpoint_name}"
-                ],
+                    resources=[
+                        f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{self.endpoint_name}"
+                    ],
+                )
             )
-        )
 
-        # Create the Lambda function with the custom role
-        function_invoke_sagemaker = lambda_.Function(
-            self,
-            "LambdaFunctionInvokeSagemaker",
-            runtime=lambda_.Runtime.PYTHON_3_13,
-            handler="lambda.handler",
-            code=lambda_.Code.from_asset("functions/core/invoke_sagemaker/src"),
-            function_name="vis-assis-invoke_sagemaker_endpoint",
-            log_retention=logs.RetentionDays.ONE_WEEK,
-            role=invoke_sagemaker_role,
-            environment={
+            invoke_environment = {
                 "ENDPOINT_NAME": self.endpoint_name,
-            },
-            timeout=Duration.seconds(30)
-        )
+            }
+            if paligemma_async:
+                # The requests are uploaded to the model bucket and the handler
+                # waits for the endpoint to write the response
+                paligemma_endpoint.grant_async_inference(invoke_sagemaker_role)
+                invoke_environment.update(
+                    ASYNC_INPUT_PATH=paligemma_endpoint.async_input_path,
+                )
 
-        """         function_invoke_sagemaker.add_to_role_policy(
-            iam.PolicyStatement(
-                effect=iam.Effect.ALLOW,
-                actions=["sagemaker:InvokeEndpoint"],
-                resources=[
-                    f"arn:aws:sagemaker:{Aws.REGION}:{Aws.ACCOUNT_ID}:endpoint/{self.endpoint_name}"
-                ],
+            # Create the Lambda function with the custom role
+            function_invoke_sagemaker = self._make_lambda(
+                "LambdaFunctionInvokeSagemaker",
+                "vis-assis-invoke_sagemaker_endpoint",
+                "handler_invoke.handler",
+                invoke_environment,
+                role=invoke_sagemaker_role,
+                log_group=invoke_log_group,
             )
-        ) """
 
-        function_get_model_url = lambda_.Function(
+            """         function_invoke_sagemaker.add_to_role_policy(
+                iam.PolicyStatement(
+                    effect=iam.Effect.ALLOW,
+                    actions=["sagemaker:InvokeEndpoint"],
+                    resources=[
+                        f"arn:aws:sagemaker:{Aws.REGION}:{Aws.ACCOUNT_ID}:endpoint/{self.endpoint_name}"
+                    ],
+                )
+            ) """
+
+        # Add log group
+        model_url_log_group = create_log_group(
             self,
+            "ModelUrlLogGroup",
+            log_group_name=f"/aws/lambda/vis-assis-model-artifact-presigned-url",
+            retention=logs.RetentionDays.ONE_WEEK,
+        )
+
+        function_get_model_url = self._make_lambda(
             "LambdaFunctionModelUrl",
-            runtime=lambda_.Runtime.PYTHON_3_13,
-            handler="lambda.handler",
-            code=lambda_.Code.from_asset("functions/core/model_presigned_url/src"),
-            function_name="vis-assis-model_artifact_presigned_url",
-            log_retention=logs.RetentionDays.ONE_WEEK,
-            environment={
+            "vis-assis-model_artifact_presigned_url",
+            "handler_url.handler",
+            {
                 "MODELS_ARTIFACTS_BUCKET": prod_model_artifacts_bucket.bucket_name,
             },
-            timeout=Duration.seconds(30)
+            log_group=model_url_log_group,
         )
 
         prod_model_artifacts_bucket.grant_read(function_get_model_url)
 
-        NagSuppressions.add_resource_suppressions_by_path(
-            Stack.of(self),
+        self._suppress_by_path(
             f"{self.node.path}/LambdaFunctionModelUrl/ServiceRole/DefaultPolicy/Resource",
             [
                 {
                     "id": "AwsSolutions-IAM5",
                     "reason": "Lambda function needs read access to all objects in the model artifacts bucket to generate presigned URLs",
                     "appliesTo": [
-                        f"Resource::<{Stack.of(self).get_logical_id(prod_model_artifacts_bucket.node.default_child)}.Arn>/*"
+                        f"Resource::<{logical_id(prod_model_artifacts_bucket.node.default_child)}.Arn>/*"
                     ],
                 }
             ],
         )
         ########## API GATEWAY #############
 
+        # VPC links only support some AZs: keep the private subnets located in them
+        vpc_link_subnets = [
+            subnet
+            for subnet in stack_vpc.select_subnets(
+                subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ).subnets
+            if subnet.availability_zone in AVAILABILITY_ZONES
+        ]
+
         apigw_construct = apigateway_construct.API(
             self,
             "ApiGwConstruct",
             lambda_invoke_sagemaker=function_invoke_sagemaker,
             lambda_models_url=function_get_model_url,
             vpc_invoke_sagemaker=stack_vpc,
+            vpc_link_subnets=vpc_link_subnets,
             cognito_user_pool=cognito_user_pool,
             cognito_user_pool_client=cognito_user_pool_client,
             trusted_origins=cors_allowed_origins,
             custom_domain_name=custom_domain_name,
-            certificate_arn=certificate_arn,
+            certificate=(
+                import_certificate(self, certificate_arn) if certificate_arn else None
+            ),
+            enable_edge_cache=enable_edge_cache,
+            prewarm_concurrency=prewarm_concurrency,
+            access_log_class=(
+                logs.LogGroupClass.INFREQUENT_ACCESS
+                if infrequent_access_logs
+                else logs.LogGroupClass.STANDARD
+            ),
         )
 
         ########## EVENTBRIDGE #############
 
-        # Rule for copying from Sagemaker output to production when an approval is done in the model registry
-
-        package_group_names = [
-            self.sagemaker_domain_users_models_construct.depth_model_package_group.model_package_group_name,
-            self.sagemaker_domain_users_models_construct.tts_model_package_group.model_package_group_name,
-            self.sagemaker_domain_users_models_construct.vocoder_model_package_group.model_package_group_name,
-            self.sagemaker_domain_users_models_construct.image_captioning_model_package_group.model_package_group_name,
-            self.sagemaker_domain_users_models_construct.object_detection_model_package_group.model_package_group_name,
-        ]
-        rule = events.Rule(
-            self,
-            "SageMakerModelStateChangeRule",
-            rule_name="copy-model-from-sagemaker-s3-to-production-s3",
-            description=f"Copies the new model from ({sagemaker_output_bucket.bucket_name}) to ({prod_model_artifacts_bucket.bucket_name}) of package group [{package_group_names}] when its state is set to approved state",
-            event_pattern=events.EventPattern(
-                source=["aws.sagemaker"],
-                detail_type=["SageMaker Model Package State Change"],
-                detail={
-                    "ModelPackageGroupName": package_group_names,
-                    "ModelApprovalStatus": ["Approved"],
-                },
-            ),
-        )
+        if not skip_sagemaker:
+            # Rule for copying from Sagemaker output to production when an approval is done in the model registry
+
+            # Plain strings (the group names are set from shared_variables), computed
+            # once for both the description and the event pattern
+            domain_construct = self.sagemaker_domain_users_models_construct
+            package_group_names = [
+                model_package_group.model_package_group_name
+                for model_package_group in (
+                    domain_construct.depth_model_package_group,
+                    domain_construct.tts_model_package_group,
+                    domain_construct.vocoder_model_package_group,
+                    domain_construct.image_captioning_model_package_group,
+                    domain_construct.object_detection_model_package_group,
+                )
+            ]
+            rule = events.Rule(
+                self,
+                "SageMakerModelStateChangeRule",
+                rule_name="copy-model-from-sagemaker-s3-to-production-s3",
+                description=f"Copies the new model from ({sagemaker_output_bucket.bucket_name}) to ({prod_model_artifacts_bucket.bucket_name}) of package group [{', '.join(package_group_names)}] when its state is set to approved state",
+                event_pattern=events.EventPattern(
+                    source=["aws.sagemaker"],
+                    detail_type=["SageMaker Model Package State Change"],
+                    detail={
+                        "ModelPackageGroupName": package_group_names,
+                        "ModelApprovalStatus": ["Approved"],
+                    },
+                ),
+            )
 
-        rule.add_target(targets.LambdaFunction(function_copy_model_from_s3_to_s3))
+            rule.add_target(targets.LambdaFunction(function_copy_model_from_s3_to_s3))
 
         ####### AMPLIFY #######
 
+        # The Amplify app environment variables are updated after the deployment
+        # from the stack outputs, see resources/amplify/update_amplify_env_vars.py
         if amplify_install:
-            print("Amplify environment variables will be updated 🚧")
-
-            # Create Amplify app with environment variables
-            amplify_env_vars = {
-                "NEXT_PUBLIC_COGNITO_USER_POOL_CLIENT_ID": cognito_user_pool_client.user_pool_client_id,
-                "NEXT_PUBLIC_COGNITO_USER_POOL_ID": cognito_user_pool.user_pool_id,
-                "NEXT_PUBLIC_API_GATEWAY_ENDPOINT": apigw_construct.get_url(),
-                "NEXT_PUBLIC_DEBUG_AUDIO": "true",
-                "NEXT_PUBLIC_DEBUG_DEPTH": "true",
-                "NEXT_PUBLIC_DEBUG_DETECTION": "true",
-                "NEXT_PUBLIC_DEBUG_IMAGE_CAPTIONING": "true",
-            }
-
-            # Update the existing Amplify App
-            update_env_vars = cr.AwsCustomResource(
-                self,
-                "UpdateEnvVars",
-                timeout=Duration.minutes(15),
-                on_update=cr.AwsSdkCall(
-                    service="Amplify",
-                    action="updateApp",
-                    parameters={
-                        "appId": amplify_app_id,
-                        "environmentVariables": amplify_env_vars,
-                    },
-                    physical_resource_id=cr.PhysicalResourceId.of("UpdateEnvVars"),
-                ),
-                policy=cr.AwsCustomResourcePolicy.from_sdk_calls(
-                    resources=[f"arn:aws:amplify:*:*:apps/{amplify_app_id}"]
-                ),
-            )
+            print("Amplify environment variables will be updated after deployment 🚧")
+
+        self._apply_path_suppressions()
+
+    def _make_lambda(
+        self,
+        construct_id: str,
+        function_name: str,
+        handler: str,
+        environment: dict,
+        *,
+        log_group: logs.ILogGroup,
+        role: Optional[iam.IRole] = None,
+        timeout: Duration = Duration.seconds(30),
+    ) -> lambda_.Function:
+        # The core functions share a single asset (staged and uploaded once),
+        # each one has its own handler module
+        if self._core_functions_code is None:
+            self._core_functions_code = lambda_.Code.from_asset("functions/core/src")
+
+        return lambda_.Function(
+            self,
+            construct_id,
+            runtime=lambda_.Runtime.PYTHON_3_13,
+            handler=handler,
+            code=self._core_functions_code,
+            function_name=function_name,
+            environment=environment,
+            timeout=timeout,
+            role=role,
+            # Explicit log group, no LogRetention custom resource
+            log_group=log_group,
+        )
+
+    def _suppress_by_path(self, path: str, suppressions: list) -> None:
+        # Queued instead of NagSuppressions.add_resource_suppressions_by_path, which
+        # walks the whole construct tree on every call
+        self._path_suppressions.append((path, suppressions))
+
+    def _apply_path_suppressions(self) -> None:
+        if not ENABLE_CDK_NAG:
+            return
+
+        # A single walk of the construct tree for all the queued suppressions
+        constructs_by_path = {
+            construct.node.path: construct for construct in self.node.find_all()
+        }
+        for path, suppressions in self._path_suppressions:
+            if path not in constructs_by_path:
+                raise ValueError(
+                    f"Suppression added by path does not match any resource: {path}"
+                )
+            add_nag_suppressions(constructs_by_path[path], suppressions)
@@ -0,0 +1,17 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import functools
+
+from aws_cdk import aws_iam as iam
+
+
+@functools.lru_cache(maxsize=None)
+def aws_managed_policy(managed_policy_name: str) -> iam.IManagedPolicy:
+    """
+    Reference to an AWS managed policy, resolved once per name.
+
+    The reference is not a construct (no scope), it can be shared by all the
+    roles of the app.
+    """
+    return iam.ManagedPolicy.from_aws_managed_policy_name(managed_policy_name)
@@ -0,0 +1,39 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# cdk-nag suppressions shared by several constructs. Plain dicts, cdk_nag is only
+# imported by add_nag_suppressions when ENABLE_CDK_NAG is set
+
+import shared_variables as shared_variables
+from aws_cdk import Stack
+from constructs import IConstruct
+
+# Findings on the resources of a cr.Provider, to add with apply_to_children=True
+PROVIDER_FRAMEWORK_SUPPRESSIONS = (
+    {
+        "id": "AwsSolutions-IAM5",
+        "reason": "The provider framework needs to invoke all the versions of the on event handler",
+    },
+    {
+        "id": "AwsSolutions-L1",
+        "reason": "The provider framework function runtime is managed by the CDK",
+    },
+)
+
+
+def add_nag_suppressions(
+    construct: IConstruct, suppressions: list, apply_to_children: bool = False
+) -> None:
+    # cdk-nag only runs with ENABLE_CDK_NAG, its assembly is not loaded otherwise
+    if not shared_variables.ENABLE_CDK_NAG:
+        return
+
+    from cdk_nag import NagSuppressions
+
+    # Stack suppressions also apply to the resources created afterwards
+    if isinstance(construct, Stack):
+        NagSuppressions.add_stack_suppressions(construct, suppressions)
+    else:
+        NagSuppressions.add_resource_suppressions(
+            construct, suppressions, apply_to_children=apply_to_children
+        )
@@ -0,0 +1,29 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+import typing
+
+from aws_cdk import CfnOutput
+from constructs import Construct
+
+
+def emit_outputs(
+    scope: Construct,
+    outputs: typing.Iterable[
+        typing.Tuple[str, str, typing.Optional[str], typing.Optional[str]]
+    ],
+) -> None:
+    """
+    Create one CfnOutput per (key, value, export_name, description) item.
+
+    export_name should only be set for outputs read by their export name
+    (e.g. by the pipelines_resources_creation.py script), None skips the export.
+    """
+    for key, value, export_name, description in outputs:
+        CfnOutput(
+            scope,
+            key,
+            value=value,
+            description=description,
+            export_name=export_name,
+        )
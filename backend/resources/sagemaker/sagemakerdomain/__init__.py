@@ -3,7 +3,8 @@
 
 """SageMaker Studio constructs for AWS CDK."""
 
-from .sagemaker_domain_users_modelgroups_construct import \
-    SagemakerDomainUsersModelGroupsConstruct
+from .sagemaker_domain_users_modelgroups_construct import (
+    SagemakerDomainUsersModelGroupsConstruct,
+)
 
 __all__ = ["SagemakerDomainUsersModelGroupsConstruct"]
@@ -1,19 +1,23 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import json
 import typing
 
-import aws_cdk as cdk
 import shared_variables as shared_variables
-from aws_cdk import Aws, CfnOutput, CfnTag, Duration, Stack
+from aws_cdk import Aws, CfnOutput, CfnTag, CustomResource, Duration
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_lambda as lambda_
 from aws_cdk import aws_sagemaker as sagemaker
 from aws_cdk import custom_resources as cr
-from cdk_nag import NagSuppressions
 from constructs import Construct
 
+from resources.managed_policies import aws_managed_policy
+from resources.nag_suppressions import (
+    PROVIDER_FRAMEWORK_SUPPRESSIONS,
+    add_nag_suppressions,
+)
+from resources.outputs import emit_outputs
+
 
 class SagemakerDomainUsersModelGroupsConstruct(Construct):
 
@@ -40,20 +44,20 @@ class SagemakerDomainUsersModelGroupsConstruct(Construct):
             assumed_by=iam.ServicePrincipal("sagemaker.amazonaws.com"),
             role_name="VisAssisRoleSagemakerStudioUsers",
             managed_policies=[
-                iam.ManagedPolicy.from_aws_managed_policy_name(
-                    "AmazonSageMakerFullAccess"  #! Demo usage, should/could be more restrictive
-                )
+                #! Demo usage, should/could be more restrictive
+                aws_managed_policy("AmazonSageMakerFullAccess")
             ],
         )
 
-        NagSuppressions.add_resource_suppressions(
+        add_nag_suppressions(
             self.role_sagemaker_domain,
             [
                 {
                     "id": "AwsSolutions-IAM4",
                     "reason": "Suppressing as this is a demo, but we ackownledge that it should be more restrictive",
                     "appliesTo": [
-                        "Policy::arn:<AWS::Partition>:iam::aws:policy/AmazonSageMakerFullAccess"
+                        "Policy::arn:<AWS::Partition>:iam::aws:policy/AmazonSageMakerFullAccess",
+                        "Policy::arn:aws:iam::aws:policy/AmazonSageMakerFullAccess",
                     ],
                 }
             ],
@@ -87,20 +91,6 @@ class SagemakerDomainUsersModelGroupsConstruct(Construct):
             export_name=shared_variables.CDK_OUT_EXPORT_SAGEMAKER_DOMAIN_ARN,
         )
 
-        # Suppressing AWS Solutions IAM4 finding for SageMaker execution role
-        NagSuppressions.add_resource_suppressions(
-            self.role_sagemaker_domain,
-            [
-                {
-                    "id": "AwsSolutions-IAM4",
-                    "reason": "SageMaker execution role requires full access to SageMaker services",
-                    "appliesTo": [
-                        "Policy::arn:aws:iam::aws:policy/AmazonSageMakerFullAccess"
-                    ],
-                }
-            ],
-        )
-
         ## DOMAIN DELETION RESOURCES ##
         # When domain is created, an EFS storage is automatically created and attached to it.
         # On stack deletion, the domain is deleted but not the EFS, leading to issues.
@@ -129,35 +119,28 @@ class SagemakerDomainUsersModelGroupsConstruct(Construct):
             )
         )
 
-        # Create a custom resource to delete the EFS
-        self.delete_efs_custom_resource = cr.AwsCustomResource(
+        # Create a custom resource to delete the EFS, the Lambda function is
+        # the on event handler of the provider (no AWS SDK call in between)
+        delete_efs_provider = cr.Provider(
+            self,
+            "DeleteEFSProvider",
+            on_event_handler=self.delete_efs_lambda,
+        )
+
+        add_nag_suppressions(
+            delete_efs_provider,
+            list(PROVIDER_FRAMEWORK_SUPPRESSIONS),
+            apply_to_children=True,
+        )
+
+        self.delete_efs_custom_resource = CustomResource(
             self,
             "DeleteEFSCustomResource",
-            function_name=self.delete_efs_lambda.function_name,
-            timeout=Duration.minutes(15),
-            on_delete=cr.AwsSdkCall(
-                service="Lambda",
-                action="invoke",
-                parameters={
-                    "FunctionName": self.delete_efs_lambda.function_name,
-                    "Payload": json.dumps({"EfsId": self.efs_arn}),
-                },
-                physical_resource_id=cr.PhysicalResourceId.of(self.efs_arn),
-            ),
-            policy=cr.AwsCustomResourcePolicy.from_statements(
-                [
-                    iam.PolicyStatement(
-                        actions=["lambda:InvokeFunction"],
-                        resources=[self.delete_efs_lambda.function_arn],
-                    )
-                ]
-            ),
+            service_token=delete_efs_provider.service_token,
+            properties={"EfsId": self.efs_arn},
         )
 
         self.delete_efs_custom_resource.node.add_dependency(self.sagemaker_domain)
-        self.delete_efs_lambda.grant_invoke(
-            self.delete_efs_custom_resource.grant_principal
-        )
 
         ## STUDIO CONSOLE USERS ##
 
@@ -180,106 +163,77 @@ class SagemakerDomainUsersModelGroupsConstruct(Construct):
 
         ## MODEL PACKAGE GROUPS ##
 
-        self.depth_model_package_group = sagemaker.CfnModelPackageGroup(
-            self,
-            "DepthTrainedModelPackageGroup",
-            model_package_group_name=shared_variables.CDK_OUT_KEY_SAGEMAKER_DEPTH_MODEL_PACKAGE_GROUP_NAME,
-            model_package_group_description="Package group for visual assistant TRAINED depth models.",
-            tags=[
-                CfnTag(
-                    key="sagemaker:domain-arn",
-                    value=self.sagemaker_domain.attr_domain_arn,
-                )
-            ],
-        )
-
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_SAGEMAKER_DEPTH_MODEL_PACKAGE_GROUP_NAME,
-            value=self.depth_model_package_group.model_package_group_name,
-            export_name=shared_variables.CDK_OUT_EXPORT_SAGEMAKER_DEPTH_MODEL_PACKAGE_GROUP_NAME,
-        )
-
-        # TTS
-        self.tts_model_package_group = sagemaker.CfnModelPackageGroup(
-            self,
-            "TTSModelPackageGroup",
-            model_package_group_name=shared_variables.CDK_OUT_KEY_SAGEMAKER_TTS_MODEL_PACKAGE_GROUP_NAME,
-            model_package_group_description="Package group for visual assistant TTS models.",
-            tags=[
-                CfnTag(
-                    key="sagemaker:domain-arn",
-                    value=self.sagemaker_domain.attr_domain_arn,
-                )
-            ],
-        )
-
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_SAGEMAKER_TTS_MODEL_PACKAGE_GROUP_NAME,
-            value=self.tts_model_package_group.model_package_group_name,
-            export_name=shared_variables.CDK_OUT_EXPORT_SAGEMAKER_TTS_MODEL_PACKAGE_GROUP_NAME,
-        )
-
-        # Vocoder
-        self.vocoder_model_package_group = sagemaker.CfnModelPackageGroup(
-            self,
-            "VocoderModelPackageGroup",
-            model_package_group_name=shared_variables.CDK_OUT_KEY_SAGEMAKER_VOCODER_MODEL_PACKAGE_GROUP_NAME,
-            model_package_group_description="Package group for visual assistant vocoder models.",
-            tags=[
-                CfnTag(
-                    key="sagemaker:domain-arn",
-                    value=self.sagemaker_domain.attr_domain_arn,
-                )
-            ],
-        )
-
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_SAGEMAKER_VOCODER_MODEL_PACKAGE_GROUP_NAME,
-            value=self.vocoder_model_package_group.model_package_group_name,
-            export_name=shared_variables.CDK_OUT_EXPORT_SAGEMAKER_VOCODER_MODEL_PACKAGE_GROUP_NAME,
-        )
-
-        # TTS - image captioning
-        self.image_captioning_model_package_group = sagemaker.CfnModelPackageGroup(
-            self,
-            "ImageCaptioningModelPackageGroup",
-            model_package_group_name=shared_variables.CDK_OUT_KEY_SAGEMAKER_IMAGE_CAPTIONING_MODEL_PACKAGE_GROUP_NAME,
-            model_package_group_description="Package group for visual assistant image captioning models.",
-            tags=[
-                CfnTag(
-                    key="sagemaker:domain-arn",
-                    value=self.sagemaker_domain.attr_domain_arn,
-                )
-            ],
-        )
+        # (attribute prefix, construct id, group name / output key, output export name, description)
+        model_package_groups = [
+            (
+                "depth",
+                "DepthTrainedModelPackageGroup",
+                shared_variables.CDK_OUT_KEY_SAGEMAKER_DEPTH_MODEL_PACKAGE_GROUP_NAME,
+                shared_variables.CDK_OUT_EXPORT_SAGEMAKER_DEPTH_MODEL_PACKAGE_GROUP_NAME,
+                "TRAINED depth",
+            ),
+            (
+                "tts",
+                "TTSModelPackageGroup",
+                shared_variables.CDK_OUT_KEY_SAGEMAKER_TTS_MODEL_PACKAGE_GROUP_NAME,
+                shared_variables.CDK_OUT_EXPORT_SAGEMAKER_TTS_MODEL_PACKAGE_GROUP_NAME,
+                "TTS",
+            ),
+            (
+                "vocoder",
+                "VocoderModelPackageGroup",
+                shared_variables.CDK_OUT_KEY_SAGEMAKER_VOCODER_MODEL_PACKAGE_GROUP_NAME,
+                shared_variables.CDK_OUT_EXPORT_SAGEMAKER_VOCODER_MODEL_PACKAGE_GROUP_NAME,
+                "vocoder",
+            ),
+            (
+                "image_captioning",
+                "ImageCaptioningModelPackageGroup",
+                shared_variables.CDK_OUT_KEY_SAGEMAKER_IMAGE_CAPTIONING_MODEL_PACKAGE_GROUP_NAME,
+                shared_variables.CDK_OUT_EXPORT_SAGEMAKER_IMAGE_CAPTIONING_MODEL_PACKAGE_GROUP_NAME,
+                "image captioning",
+            ),
+            (
+                "object_detection",
+                "ObjectDetectionModelPackageGroup",
+                shared_variables.CDK_OUT_KEY_SAGEMAKER_OBJECT_DETECTION_MODEL_PACKAGE_GROUP_NAME,
+                shared_variables.CDK_OUT_EXPORT_SAGEMAKER_OBJECT_DETECTION_MODEL_PACKAGE_GROUP_NAME,
+                "object detection",
+            ),
+        ]
 
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_SAGEMAKER_IMAGE_CAPTIONING_MODEL_PACKAGE_GROUP_NAME,
-            value=self.image_captioning_model_package_group.model_package_group_name,
-            export_name=shared_variables.CDK_OUT_EXPORT_SAGEMAKER_IMAGE_CAPTIONING_MODEL_PACKAGE_GROUP_NAME,
+        # All the groups are tagged with the domain they belong to
+        domain_tag = CfnTag(
+            key="sagemaker:domain-arn",
+            value=self.sagemaker_domain.attr_domain_arn,
         )
 
-        # Object detection
-        self.object_detection_model_package_group = sagemaker.CfnModelPackageGroup(
-            self,
-            "ObjectDetectionModelPackageGroup",
-            model_package_group_name=shared_variables.CDK_OUT_KEY_SAGEMAKER_OBJECT_DETECTION_MODEL_PACKAGE_GROUP_NAME,
-            model_package_group_description="Package group for visual assistant object detection models.",
-            tags=[
-                CfnTag(
-                    key="sagemaker:domain-arn",
-                    value=self.sagemaker_domain.attr_domain_arn,
+        model_package_group_outputs = []
+        for (
+            attribute_prefix,
+            group_id,
+            group_name,
+            output_export_name,
+            description,
+        ) in model_package_groups:
+            model_package_group = sagemaker.CfnModelPackageGroup(
+                self,
+                group_id,
+                model_package_group_name=group_name,
+                model_package_group_description=f"Package group for visual assistant {description} models.",
+                tags=[domain_tag],
+            )
+            # e.g. self.depth_model_package_group
+            setattr(
+                self, f"{attribute_prefix}_model_package_group", model_package_group
+            )
+            model_package_group_outputs.append(
+                (
+                    group_name,
+                    model_package_group.model_package_group_name,
+                    output_export_name,
+                    None,
                 )
-            ],
-        )
+            )
 
-        CfnOutput(
-            self,
-            shared_variables.CDK_OUT_KEY_SAGEMAKER_OBJECT_DETECTION_MODEL_PACKAGE_GROUP_NAME,
-            value=self.object_detection_model_package_group.model_package_group_name,
-            export_name=shared_variables.CDK_OUT_EXPORT_SAGEMAKER_OBJECT_DETECTION_MODEL_PACKAGE_GROUP_NAME,
-        )
+        emit_outputs(self, model_package_group_outputs)
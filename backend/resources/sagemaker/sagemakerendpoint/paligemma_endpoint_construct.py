@@ -1,9 +1,10 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
-import json
+from typing import Optional
 
 import aws_cdk as cdk
+import shared_variables as shared_variables
 from aws_cdk import Duration, Fn, RemovalPolicy
 from aws_cdk import aws_events as events
 from aws_cdk import aws_events_targets as events_targets
@@ -12,11 +13,34 @@ from aws_cdk import aws_lambda as lambda_
 from aws_cdk import aws_logs as logs
 from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_s3_notifications as s3n
+from aws_cdk import aws_sns as sns
+from aws_cdk import aws_sqs as sqs
 from aws_cdk import custom_resources as cr
-from cdk_nag import NagSuppressions
+from aws_cdk.aws_lambda_event_sources import SqsEventSource
 from constructs import Construct
 
+from resources.log_groups import create_log_group
+from resources.managed_policies import aws_managed_policy
+from resources.nag_suppressions import (
+    PROVIDER_FRAMEWORK_SUPPRESSIONS,
+    add_nag_suppressions,
+)
+
 PUBLIC_IMAGE_ACCOUNT_ID = "763104351884" # https://github.com/aws/deep-learning-containers/blob/master/available_images.md
+PUBLIC_IMAGE_NAME = "huggingface-pytorch-inference:2.1.0-transformers4.37.0-gpu-py310-cu118-ubuntu20.04"
+PUBLIC_IMAGE_REPOSITORY = PUBLIC_IMAGE_NAME.split(":")[0]
+
+# Uploads triggering the model update function, see update_sm_endpoint_model
+MODEL_ARCHIVE_KEY = "paligemma/model.tar.gz"
+MODEL_UPLOAD_MARKER_KEY = "paligemma/model.done"
+
+# Async inference requests and responses, outside of the paligemma/ prefix which
+# triggers the model update function
+ASYNC_INFERENCE_PREFIX = "async-inference/"
+ASYNC_INPUT_PREFIX = f"{ASYNC_INFERENCE_PREFIX}input/"
+ASYNC_OUTPUT_PREFIX = f"{ASYNC_INFERENCE_PREFIX}output/"
+ASYNC_FAILURE_PREFIX = f"{ASYNC_INFERENCE_PREFIX}failure/"
+
 
 class PaLiGemmaEndpointConstruct(Construct):
 
@@ -24,6 +48,10 @@ class PaLiGemmaEndpointConstruct(Construct):
     def endpoint_name(self) -> str:
         return self.__endpoint_name
 
+    @property
+    def async_input_path(self) -> str:
+        return f"s3://{self.__model_bucket.bucket_name}/{ASYNC_INPUT_PREFIX}"
+
     def __init__(
         self,
         scope: Construct,
@@ -32,6 +60,10 @@ class PaLiGemmaEndpointConstruct(Construct):
         logs_bucket: s3.Bucket,
         instance_type: str = "ml.g5.xlarge",
         import_existing_s3_bucket: bool = False,
+        ephemeral: bool = True,
+        async_inference: bool = False,
+        model_image_directory: Optional[str] = None,
+        endpoint_log_retention: logs.RetentionDays = logs.RetentionDays.ONE_WEEK,
         **kwargs,
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
@@ -41,6 +73,14 @@ class PaLiGemmaEndpointConstruct(Construct):
 
         self.__endpoint_name = f"paligemma-endpoint-" + self.account
 
+        # SageMaker ARNs shared by the policies of this construct
+        sagemaker_arn_prefix = f"arn:aws:sagemaker:{self.region}:{self.account}"
+        endpoint_arn = f"{sagemaker_arn_prefix}:endpoint/{self.__endpoint_name}"
+        endpoint_config_arn_pattern = (
+            f"{sagemaker_arn_prefix}:endpoint-config/paligemma-endpoint-config-*"
+        )
+        model_arn_pattern = f"{sagemaker_arn_prefix}:model/paligemma-model-*"
+
         # Create a new S3 bucket for model storage
         if import_existing_s3_bucket:
             model_bucket = s3.Bucket.from_bucket_name(
@@ -53,8 +93,10 @@ class PaLiGemmaEndpointConstruct(Construct):
                 self,
                 "PaLiGemmaModelBucket",
                 bucket_name="vis-assis-sagemaker-endpoint-model-" + self.account,
-                removal_policy=RemovalPolicy.DESTROY,
-                auto_delete_objects=True,
+                removal_policy=(
+                    RemovalPolicy.DESTROY if ephemeral else RemovalPolicy.RETAIN
+                ),
+                auto_delete_objects=ephemeral,
                 block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
                 encryption=s3.BucketEncryption.S3_MANAGED,
                 enforce_ssl=True,
@@ -62,16 +104,15 @@ class PaLiGemmaEndpointConstruct(Construct):
                 server_access_logs_prefix="paligemma-model-bucket-access-logs/",
             )
 
-        # Create SageMaker execution role with minimal required permissions
-        sagemaker_execution_role = iam.Role(
-            self,
-            "PaLiGemmaModelExecutionRole",
-            assumed_by=iam.ServicePrincipal("sagemaker.amazonaws.com"),
-        )
+        self.__model_bucket = model_bucket
+
+        # SageMaker execution role statements, the role is created with a single
+        # inline policy once they are all collected
+        execution_statements = []
 
         #! AwsSolutions-IAM5[Action::s3:GetBucket*]
         # Add specific S3 permissions instead of using grant_read
-        sagemaker_execution_role.add_to_policy(
+        execution_statements.append(
             iam.PolicyStatement(
                 actions=[
                     "s3:GetObject",
@@ -85,7 +126,7 @@ class PaLiGemmaEndpointConstruct(Construct):
         )
 
         # Add minimal required SageMaker permissions
-        sagemaker_execution_role.add_to_policy(
+        execution_statements.append(
             iam.PolicyStatement(
                 actions=[
                     "sagemaker:AddTags",
@@ -97,27 +138,60 @@ class PaLiGemmaEndpointConstruct(Construct):
                     "sagemaker:DescribeEndpoint",
                 ],
                 resources=[
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:model/paligemma-model-*",
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint-config/paligemma-endpoint-config-*",
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint/paligemma-endpoint*",
+                    model_arn_pattern,
+                    endpoint_config_arn_pattern,
+                    f"{sagemaker_arn_prefix}:endpoint/paligemma-endpoint*",
                 ],
             )
         )
 
-        # Add specific ECR permissions for the image repository
-        sagemaker_execution_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "ecr:GetDownloadUrlForLayer",
-                    "ecr:BatchGetImage",
-                    "ecr:BatchCheckLayerAvailability",
-                ],
-                resources=[f"arn:aws:ecr:{self.region}:{PUBLIC_IMAGE_ACCOUNT_ID}:repository/*"],
-            )
+        image: str = (
+            f"{PUBLIC_IMAGE_ACCOUNT_ID}.dkr.ecr.{self.region}.amazonaws.com/{PUBLIC_IMAGE_NAME}"
         )
 
+        # Optional private image with the model weights baked in, the instances
+        # then start without downloading and extracting the model from S3
+        model_image = None
+        if model_image_directory:
+            from aws_cdk import aws_ecr_assets as ecr_assets
+
+            model_image = ecr_assets.DockerImageAsset(
+                self,
+                "PaLiGemmaImage",
+                directory=model_image_directory,
+                # Build arguments are resolved at synthesis time (no region token)
+                build_args={
+                    "BASE_IMAGE": f"{PUBLIC_IMAGE_ACCOUNT_ID}.dkr.ecr.{cdk.Stack.of(self).region}.amazonaws.com/{PUBLIC_IMAGE_NAME}"
+                },
+            )
+            execution_statements.append(
+                iam.PolicyStatement(
+                    actions=[
+                        "ecr:GetDownloadUrlForLayer",
+                        "ecr:BatchGetImage",
+                        "ecr:BatchCheckLayerAvailability",
+                    ],
+                    resources=[model_image.repository.repository_arn],
+                )
+            )
+            image = model_image.image_uri
+        else:
+            # Add specific ECR permissions for the image repository
+            execution_statements.append(
+                iam.PolicyStatement(
+                    actions=[
+                        "ecr:GetDownloadUrlForLayer",
+                        "ecr:BatchGetImage",
+                        "ecr:BatchCheckLayerAvailability",
+                    ],
+                    resources=[
+                        f"arn:aws:ecr:{self.region}:{PUBLIC_IMAGE_ACCOUNT_ID}:repository/{PUBLIC_IMAGE_REPOSITORY}"
+                    ],
+                )
+            )
+
         # Add ECR permissions for token to access
-        sagemaker_execution_role.add_to_policy(
+        execution_statements.append(
             iam.PolicyStatement(
                 actions=[
                     "ecr:GetAuthorizationToken",
@@ -126,25 +200,97 @@ class PaLiGemmaEndpointConstruct(Construct):
             )
         )
 
+        # Endpoint log group, otherwise created by SageMaker without retention
+        # and kept after the stack deletion
+        self.endpoint_log_group = create_log_group(
+            self,
+            "EndpointLogGroup",
+            log_group_name=f"/aws/sagemaker/Endpoints/{self.__endpoint_name}",
+            retention=endpoint_log_retention,
+        )
+
         # Add CloudWatch Logs permissions
-        sagemaker_execution_role.add_to_policy(
+        execution_statements.append(
             iam.PolicyStatement(
                 actions=[
-                    "logs:CreateLogGroup",
                     "logs:CreateLogStream",
                     "logs:PutLogEvents",
                 ],
                 resources=[
-                    f"arn:aws:logs:{self.region}:{self.account}:log-group:/aws/sagemaker/Endpoints/{self.__endpoint_name}*",
-                    f"arn:aws:logs:{self.region}:{self.account}:log-group:/aws/sagemaker/Endpoints/{self.__endpoint_name}*:log-stream:*",
+                    self.endpoint_log_group.log_group_arn,
+                    f"{self.endpoint_log_group.log_group_arn}:*",  # For streams within the group
                 ],
             )
         )
 
+        # Async inference: the endpoint reads the requests and writes the responses
+        # to the model bucket, failed invocations are notified to the error topic
+        endpoint_environment = {}
+        if async_inference:
+            error_topic = sns.Topic(
+                self,
+                "AsyncInferenceErrorTopic",
+                display_name="PaLiGemma async inference errors",
+                enforce_ssl=True,
+            )
+            add_nag_suppressions(
+                error_topic,
+                [
+                    {
+                        "id": "AwsSolutions-SNS2",
+                        "reason": "The topic only carries inference failure notifications, no sensitive data",
+                    },
+                ],
+            )
+            # The requests and responses are only read while the invoke function
+            # waits for them. Imported buckets keep their own lifecycle rules
+            if not import_existing_s3_bucket:
+                model_bucket.add_lifecycle_rule(
+                    id="ExpireAsyncInference",
+                    prefix=ASYNC_INFERENCE_PREFIX,
+                    expiration=Duration.days(1),
+                )
+            execution_statements.append(
+                iam.PolicyStatement(
+                    actions=["sns:Publish"],
+                    resources=[error_topic.topic_arn],
+                )
+            )
+            execution_statements.append(
+                iam.PolicyStatement(
+                    actions=["s3:GetObject"],
+                    resources=[model_bucket.arn_for_objects(f"{ASYNC_INPUT_PREFIX}*")],
+                )
+            )
+            execution_statements.append(
+                iam.PolicyStatement(
+                    actions=["s3:PutObject"],
+                    resources=[
+                        model_bucket.arn_for_objects(f"{ASYNC_OUTPUT_PREFIX}*"),
+                        model_bucket.arn_for_objects(f"{ASYNC_FAILURE_PREFIX}*"),
+                    ],
+                )
+            )
+
+            endpoint_environment = {
+                "ASYNC_OUTPUT_PATH": f"s3://{model_bucket.bucket_name}/{ASYNC_OUTPUT_PREFIX}",
+                "ASYNC_FAILURE_PATH": f"s3://{model_bucket.bucket_name}/{ASYNC_FAILURE_PREFIX}",
+                "ASYNC_ERROR_TOPIC_ARN": error_topic.topic_arn,
+            }
+
+        # Create SageMaker execution role with minimal required permissions
+        sagemaker_execution_role = iam.Role(
+            self,
+            "PaLiGemmaModelExecutionRole",
+            assumed_by=iam.ServicePrincipal("sagemaker.amazonaws.com"),
+            inline_policies={
+                "SMExecPolicy": iam.PolicyDocument(statements=execution_statements)
+            },
+        )
+
         #! Necessary suppressions for AwsSolutions-IAM5
-        NagSuppressions.add_resource_suppressions_by_path(
-            cdk.Stack.of(self),
-            f"/{self.node.path}/PaLiGemmaModelExecutionRole/DefaultPolicy/Resource",
+        add_nag_suppressions(
+            sagemaker_execution_role,
             [
                 {
                     "id": "AwsSolutions-IAM5",
@@ -162,23 +308,28 @@ class PaLiGemmaEndpointConstruct(Construct):
                 },
                 {
                     "id": "AwsSolutions-IAM5",
-                    "reason": "SageMaker requires wildcard for endpoint config names as they are dynamically created",
+                    "reason": "Async inference requests and responses have dynamic object names",
                     "appliesTo": [
-                        "Resource::arn:aws:sagemaker:<AWS::Region>:<AWS::AccountId>:endpoint-config/paligemma-endpoint-config-*"
+                        f"Resource::<{cdk.Stack.of(self).get_logical_id(model_bucket.node.default_child)}.Arn>/{prefix}*"
+                        for prefix in (
+                            ASYNC_INPUT_PREFIX,
+                            ASYNC_OUTPUT_PREFIX,
+                            ASYNC_FAILURE_PREFIX,
+                        )
                     ],
                 },
                 {
                     "id": "AwsSolutions-IAM5",
-                    "reason": "SageMaker requires wildcard for endpoint names as they are dynamically created",
+                    "reason": "SageMaker requires wildcard for endpoint config names as they are dynamically created",
                     "appliesTo": [
-                        "Resource::arn:aws:sagemaker:<AWS::Region>:<AWS::AccountId>:endpoint/paligemma-endpoint*"
+                        "Resource::arn:aws:sagemaker:<AWS::Region>:<AWS::AccountId>:endpoint-config/paligemma-endpoint-config-*"
                     ],
                 },
                 {
                     "id": "AwsSolutions-IAM5",
-                    "reason": "ECR requires wildcard to access all repositories in the HuggingFace account",
+                    "reason": "SageMaker requires wildcard for endpoint names as they are dynamically created",
                     "appliesTo": [
-                        "Resource::arn:aws:ecr:<AWS::Region>:<AWS::AccountId>:repository/*"
+                        "Resource::arn:aws:sagemaker:<AWS::Region>:<AWS::AccountId>:endpoint/paligemma-endpoint*"
                     ],
                 },
                 {
@@ -188,87 +339,86 @@ class PaLiGemmaEndpointConstruct(Construct):
                 },
                 {
                     "id": "AwsSolutions-IAM5",
-                    "reason": "CloudWatch Logs requires wildcard for dynamic log groups and streams",
+                    "reason": "CloudWatch Logs requires wildcard for the log streams of the endpoint log group",
                     "appliesTo": [
-                        "Resource::arn:aws:logs:<AWS::Region>:<AWS::AccountId>:log-group:/aws/sagemaker/Endpoints/paligemma-endpoint-<AWS::AccountId>*",
-                        "Resource::arn:aws:logs:<AWS::Region>:<AWS::AccountId>:log-group:/aws/sagemaker/Endpoints/paligemma-endpoint-<AWS::AccountId>*:log-stream:*",
+                        f"Resource::<{cdk.Stack.of(self).get_logical_id(self.endpoint_log_group.node.default_child)}.Arn>:*",
                     ],
                 },
             ],
         )
 
-        image: str = (
-            f"{PUBLIC_IMAGE_ACCOUNT_ID}.dkr.ecr.{self.region}.amazonaws.com/huggingface-pytorch-inference:2.1.0-transformers4.37.0-gpu-py310-cu118-ubuntu20.04"
-        )
-
         ######## Lambda function to update the endpoint ########
 
-        update_model_log_group = logs.LogGroup(
+        update_model_log_group = create_log_group(
             self,
             "UpdateModelFunctionLogGroup",
             log_group_name="/aws/lambda/vis-assis-update-paligemma-endpoint",
             retention=logs.RetentionDays.ONE_WEEK,
-            removal_policy=RemovalPolicy.DESTROY,
         )
 
         update_model_role = iam.Role(
             self,
             "UpdateModelFunctionRole",
             assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
-        )
-
-        update_model_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "logs:CreateLogStream",
-                    "logs:PutLogEvents",
-                ],
-                resources=[
-                    update_model_log_group.log_group_arn,
-                    f"{update_model_log_group.log_group_arn}:*",  # For streams within the group
-                ],
-            )
-        )
-
-        update_model_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "sagemaker:DescribeEndpoint",
-                    "sagemaker:DescribeEndpointConfig",
-                ],
-                resources=[
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{self.__endpoint_name}",
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint-config/paligemma-endpoint-config-*",
-                ],
-            )
-        )
-
-        update_model_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "sagemaker:AddTags",
-                    "sagemaker:CreateEndpoint",
-                    "sagemaker:UpdateEndpoint",
-                    "sagemaker:CreateModel",
-                    "sagemaker:DeleteModel",
-                    "sagemaker:DescribeModel",
-                    "sagemaker:CreateEndpointConfig",
-                    "sagemaker:DeleteEndpointConfig",
-                ],
-                resources=[
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{self.__endpoint_name}",
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:model/paligemma-model-*",
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint-config/paligemma-endpoint-config-*",
-                ],
-            )
-        )
-
-        # Add specific IAM pass role permission
-        update_model_role.add_to_policy(
-            iam.PolicyStatement(
-                actions=["iam:PassRole"],
-                resources=[sagemaker_execution_role.role_arn],
-            )
+            inline_policies={
+                "UpdateModelPolicy": iam.PolicyDocument(
+                    statements=[
+                        iam.PolicyStatement(
+                            actions=[
+                                "logs:CreateLogStream",
+                                "logs:PutLogEvents",
+                            ],
+                            resources=[
+                                update_model_log_group.log_group_arn,
+                                f"{update_model_log_group.log_group_arn}:*",  # For streams within the group
+                            ],
+                        ),
+                        iam.PolicyStatement(
+                            actions=[
+                                "sagemaker:DescribeEndpoint",
+                                "sagemaker:DescribeEndpointConfig",
+                            ],
+                            resources=[
+                                endpoint_arn,
+                                endpoint_config_arn_pattern,
+                            ],
+                        ),
+                        iam.PolicyStatement(
+                            actions=[
+                                "sagemaker:AddTags",
+                                "sagemaker:CreateEndpoint",
+                                "sagemaker:UpdateEndpoint",
+                                "sagemaker:CreateModel",
+                                "sagemaker:DeleteModel",
+                                "sagemaker:DescribeModel",
+                                "sagemaker:CreateEndpointConfig",
+                                "sagemaker:DeleteEndpointConfig",
+                            ],
+                            resources=[
+                                endpoint_arn,
+                                model_arn_pattern,
+                                endpoint_config_arn_pattern,
+                            ],
+                        ),
+                        # Add specific IAM pass role permission
+                        iam.PolicyStatement(
+                            actions=["iam:PassRole"],
+                            resources=[sagemaker_execution_role.role_arn],
+                        ),
+                        # Read the model files only (instead of grant_read). Listing the
+                        # bucket is not limited to a prefix, HeadObject then returns 404
+                        # instead of 403 when there is no model archive
+                        iam.PolicyStatement(
+                            actions=["s3:GetObject"],
+                            resources=[model_bucket.arn_for_objects("paligemma/*")],
+                        ),
+                        iam.PolicyStatement(
+                            actions=["s3:ListBucket"],
+                            resources=[model_bucket.bucket_arn],
+                        ),
+                    ]
+                ),
+            },
         )
 
         # Create a Lambda function to handle model updates and endpoint creation/update
@@ -291,17 +441,18 @@ class PaLiGemmaEndpointConstruct(Construct):
                 "INSTANCE_TYPE": instance_type,
                 "BUCKET_NAME": model_bucket.bucket_name,
                 "DOMAIN_ARN": sagemaker_domain_arn,
+                **endpoint_environment,
             },
         )
 
-        #! Necessary suppressions for AwsSolutions-IAM5
-        NagSuppressions.add_resource_suppressions_by_path(
-            cdk.Stack.of(self),
-            f"/{self.node.path}/UpdateModelFunctionRole/DefaultPolicy/Resource",
+        #! Necessary suppressions for AwsSolutions-IAM5, on the inline policy and on
+        # the default policy (bucket and queue grants)
+        add_nag_suppressions(
+            update_model_role,
             [
                 {
                     "id": "AwsSolutions-IAM5",
-                    "reason": "SageMaker endpoint configs are created with dynamic names for versioning",
+                    "reason": "SageMaker endpoint configs are created with dynamic names for versioning (model ETag and config kind, e.g. least outstanding requests routing)",
                     "applies_to": [
                         "Resource::arn:aws:sagemaker:<AWS::Region>:<AWS::AccountId>:endpoint-config/paligemma-endpoint-config-*"
                     ],
@@ -317,23 +468,20 @@ class PaLiGemmaEndpointConstruct(Construct):
                     "id": "AwsSolutions-IAM5",
                     "reason": "Required S3 permissions to access model artifacts",
                     "applies_to": [
-                        "Action::s3:GetObject*",
-                        "Action::s3:GetBucket*",
-                        "Action::s3:List*",
                         f"Resource::<{cdk.Stack.of(self).get_logical_id(model_bucket.node.default_child)}.Arn>/paligemma/*",
                     ],
                 },
             ],
+            apply_to_children=True,
         )
 
         ######## Lambda function to setup autoscaling ########
 
-        setup_autoscaling_log_group = logs.LogGroup(
+        setup_autoscaling_log_group = create_log_group(
             self,
             "SetupAutoscalingLogGroup",
             log_group_name="/aws/lambda/vis-assis-setup-paligemma-autoscaling",
             retention=logs.RetentionDays.ONE_WEEK,
-            removal_policy=cdk.RemovalPolicy.DESTROY,
         )
 
         setup_autoscaling_role = iam.Role(
@@ -370,6 +518,10 @@ class PaLiGemmaEndpointConstruct(Construct):
             log_group=setup_autoscaling_log_group,
             memory_size=256,
             role=setup_autoscaling_role,
+            environment={
+                "ASYNC_INFERENCE": str(async_inference).lower(),
+                "BACKLOG_ALARM_NAME": f"{self.__endpoint_name}-backlog-without-capacity",
+            },
         )
 
         # Add service-linked role creation permission with condition
@@ -409,8 +561,8 @@ class PaLiGemmaEndpointConstruct(Construct):
                     "sagemaker:UpdateEndpointWeightsAndCapacities",
                 ],
                 resources=[
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{self.__endpoint_name}",
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint-config/*",
+                    endpoint_arn,
+                    f"{sagemaker_arn_prefix}:endpoint-config/*",
                 ],
             )
         )
@@ -427,9 +579,9 @@ class PaLiGemmaEndpointConstruct(Construct):
             )
         )
 
-        NagSuppressions.add_resource_suppressions_by_path(
-            cdk.Stack.of(self),
-            f"/{self.node.path}/SetupAutoscalingRole/Resource",
+        # The role inline policy (logs) and its default policy
+        add_nag_suppressions(
+            setup_autoscaling_role,
             [
                 {
                     "id": "AwsSolutions-IAM5",
@@ -438,13 +590,6 @@ class PaLiGemmaEndpointConstruct(Construct):
                         f"Resource::<{cdk.Stack.of(setup_autoscaling_log_group).get_logical_id(setup_autoscaling_log_group.node.default_child)}.Arn>:*"
                     ],
                 },
-            ],
-        )
-
-        NagSuppressions.add_resource_suppressions_by_path(
-            cdk.Stack.of(self),
-            f"/{self.node.path}/SetupAutoscalingRole/DefaultPolicy/Resource",
-            [
                 {
                     "id": "AwsSolutions-IAM5",
                     "reason": "Required for creating SageMaker autoscaling service-linked role",
@@ -474,6 +619,7 @@ class PaLiGemmaEndpointConstruct(Construct):
                     ],
                 },
             ],
+            apply_to_children=True,
         )
 
         # Create EventBridge rule to monitor endpoint status changes
@@ -493,19 +639,123 @@ class PaLiGemmaEndpointConstruct(Construct):
             events_targets.LambdaFunction(setup_autoscaling_function)
         )
 
-        # Grant Lambda function read access only to the specific prefix
-        model_bucket.grant_read(
-            update_model_function, objects_key_pattern="paligemma/*"
-        )
-        # Create an S3 notification for the model file
-        model_bucket.add_event_notification(
-            s3.EventType.OBJECT_CREATED,
-            s3n.LambdaDestination(update_model_function),
-            s3.NotificationKeyFilter(prefix="paligemma/"),
-        )
+        if model_image:
+            # The model is deployed with the stack, each new image version changes
+            # the resource properties and updates the endpoint
+            update_model_provider = cr.Provider(
+                self,
+                "UpdateModelProvider",
+                on_event_handler=update_model_function,
+            )
+
+            add_nag_suppressions(
+                update_model_provider,
+                list(PROVIDER_FRAMEWORK_SUPPRESSIONS),
+                apply_to_children=True,
+            )
+
+            cdk.CustomResource(
+                self,
+                "UpdateEndpointCustomResource",
+                service_token=update_model_provider.service_token,
+                properties={"ModelImageVersion": model_image.asset_hash},
+            )
+        else:
+            # Notifications the update keeps failing on (e.g. an upload without
+            # any model file) are set aside instead of being retried until expiry
+            model_upload_dead_letter_queue = sqs.Queue(
+                self,
+                "ModelUploadDeadLetterQueue",
+                retention_period=Duration.days(14),
+                enforce_ssl=True,
+            )
+
+            # The S3 notifications for the model file go through a queue, uploads
+            # within a minute are handled by a single endpoint update
+            model_upload_queue = sqs.Queue(
+                self,
+                "ModelUploadQueue",
+                # Longer than the function timeout
+                visibility_timeout=Duration.minutes(16),
+                enforce_ssl=True,
+                dead_letter_queue=sqs.DeadLetterQueue(
+                    max_receive_count=3,
+                    queue=model_upload_dead_letter_queue,
+                ),
+            )
+            # Only complete uploads: the archive (a single object) or the marker
+            # uploaded after the uncompressed model files
+            for key in (MODEL_ARCHIVE_KEY, MODEL_UPLOAD_MARKER_KEY):
+                model_bucket.add_event_notification(
+                    s3.EventType.OBJECT_CREATED,
+                    s3n.SqsDestination(model_upload_queue),
+                    s3.NotificationKeyFilter(prefix=key),
+                )
+            update_model_function.add_event_source(
+                SqsEventSource(
+                    model_upload_queue,
+                    batch_size=10,
+                    max_batching_window=Duration.seconds(60),
+                )
+            )
 
         ####### Cleanup on delete #######
 
+        cleanup_role = iam.Role(
+            self,
+            "CleanupFunctionRole",
+            assumed_by=iam.ServicePrincipal("lambda.amazonaws.com"),
+            managed_policies=[
+                aws_managed_policy("service-role/AWSLambdaBasicExecutionRole")
+            ],
+            inline_policies={
+                "CleanupPolicy": iam.PolicyDocument(
+                    statements=[
+                        iam.PolicyStatement(
+                            actions=[
+                                "sagemaker:ListEndpointConfigs",
+                                "sagemaker:ListModels",
+                            ],
+                            resources=[
+                                "*"
+                            ],  # List operations don't support resource-level permissions
+                        ),
+                        iam.PolicyStatement(
+                            actions=[
+                                "sagemaker:DescribeEndpoint",
+                                "sagemaker:DeleteEndpoint",
+                                "sagemaker:DeleteEndpointConfig",
+                                "sagemaker:DeleteModel",
+                            ],
+                            resources=[
+                                endpoint_arn,
+                                endpoint_config_arn_pattern,
+                                model_arn_pattern,
+                            ],
+                        ),
+                        # The scalable target is not deleted with the endpoint
+                        iam.PolicyStatement(
+                            actions=["application-autoscaling:DescribeScalingPolicies"],
+                            resources=["*"],
+                        ),
+                        iam.PolicyStatement(
+                            actions=[
+                                "application-autoscaling:DeleteScalingPolicy",
+                                "application-autoscaling:DeregisterScalableTarget",
+                            ],
+                            resources=["*"],
+                            conditions={
+                                "StringLike": {
+                                    "application-autoscaling:service-namespace": "sagemaker",
+                                    "application-autoscaling:scalable-dimension": "sagemaker:variant:DesiredInstanceCount",
+                                }
+                            },
+                        ),
+                    ]
+                ),
+            },
+        )
+
         cleanup_function = lambda_.Function(
             self,
             "CleanupFunction",
@@ -515,44 +765,22 @@ class PaLiGemmaEndpointConstruct(Construct):
             code=lambda_.Code.from_asset(
                 "functions/cleanup/delete_sagemaker_model_and_config/src"
             ),
+            role=cleanup_role,
         )
 
-        cleanup_function.add_to_role_policy(
-            iam.PolicyStatement(
-                actions=[
-                    "sagemaker:ListEndpointConfigs",
-                    "sagemaker:ListModels",
-                ],
-                resources=[
-                    "*"
-                ],  # List operations don't support resource-level permissions
-            )
-        )
-
-        cleanup_function.add_to_role_policy(
-            iam.PolicyStatement(
-                actions=["sagemaker:DeleteEndpointConfig", "sagemaker:DeleteModel"],
-                resources=[
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint-config/paligemma-endpoint-config-*",
-                    f"arn:aws:sagemaker:{self.region}:{self.account}:model/paligemma-model-*",
-                ],
-            )
-        )
-
-        NagSuppressions.add_resource_suppressions_by_path(
-            cdk.Stack.of(self),
-            f"{self.node.path}/CleanupFunction/ServiceRole/DefaultPolicy/Resource",
+        add_nag_suppressions(
+            cleanup_role,
             [
                 {
                     "id": "AwsSolutions-IAM5",
-                    "reason": "Cleanup function needs to list and delete SageMaker resources. Resource wildcards are required as resource names are dynamic.",
+                    "reason": "Cleanup function needs to list and delete SageMaker resources and deregister the endpoint autoscaling. Resource wildcards are required as resource names are dynamic, Application Autoscaling requires * resource with conditions.",
                     "appliesTo": ["Resource::*"],
                 },
                 {
                     "id": "AwsSolutions-IAM5",
                     "reason": "Cleanup function needs to delete any endpoint configs. Wildcard required as names are dynamic.",
                     "appliesTo": [
-                        "Resource::arn:aws:sagemaker:<AWS::Region>:<AWS::AccountId>:endpoint-config/*"
+                        "Resource::arn:aws:sagemaker:<AWS::Region>:<AWS::AccountId>:endpoint-config/paligemma-endpoint-config-*"
                     ],
                 },
                 {
@@ -565,143 +793,94 @@ class PaLiGemmaEndpointConstruct(Construct):
             ],
         )
 
-        # Custom resource to delete the endpoint
-        delete_endpoint_cr = cr.AwsCustomResource(
+        # Single custom resource deleting the endpoint, its configs and the models
+        cleanup_provider = cr.Provider(
             self,
-            "DeleteEndpointCustomResource",
-            on_delete=cr.AwsSdkCall(
-                service="SageMaker",
-                action="deleteEndpoint",
-                parameters={"EndpointName": self.__endpoint_name},
-                ignore_error_codes_matching="ValidationException|ResourceNotFound",
-            ),
-            policy=cr.AwsCustomResourcePolicy.from_statements(
-                [
-                    iam.PolicyStatement(
-                        actions=["sagemaker:DeleteEndpoint"],
-                        resources=[
-                            f"arn:aws:sagemaker:{self.region}:{self.account}:endpoint/{self.__endpoint_name}"
-                        ],
-                    ),
-                    iam.PolicyStatement(
-                        actions=["application-autoscaling:DeregisterScalableTarget"],
-                        resources=["*"],
-                        conditions={
-                            "StringLike": {
-                                "application-autoscaling:service-namespace": "sagemaker",
-                                "application-autoscaling:scalable-dimension": "sagemaker:variant:DesiredInstanceCount",
-                            }
-                        },
-                    ),
-                ]
-            ),
-        )
+            "CleanupProvider",
+            on_event_handler=cleanup_function,
+        )
+
+        add_nag_suppressions(
+            cleanup_provider,
+            list(PROVIDER_FRAMEWORK_SUPPRESSIONS),
+            apply_to_children=True,
+        )
+
+        cleanup_properties = {
+            "EndpointName": self.__endpoint_name,
+            "ConfigPrefix": "paligemma-endpoint-config-",
+            "ModelPrefix": "paligemma-model-",
+        }
+        # The backlog alarm is created by the setup autoscaling function
+        if async_inference:
+            backlog_alarm_name = f"{self.__endpoint_name}-backlog-without-capacity"
+            cleanup_properties["AlarmName"] = backlog_alarm_name
+            cleanup_role.add_to_policy(
+                iam.PolicyStatement(
+                    actions=["cloudwatch:DeleteAlarms"],
+                    resources=[
+                        f"arn:aws:cloudwatch:{self.region}:{self.account}:alarm:{backlog_alarm_name}"
+                    ],
+                )
+            )
 
-        # Update the suppression to reflect the new IAM policy
-        NagSuppressions.add_resource_suppressions_by_path(
-            cdk.Stack.of(self),
-            f"{self.node.path}/DeleteEndpointCustomResource/CustomResourcePolicy/Resource",
-            [
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "Required for deregistering autoscaling target during endpoint deletion. Application Autoscaling requires * resource with conditions.",
-                    "appliesTo": ["Resource::*"],
-                }
-            ],
+        cdk.CustomResource(
+            self,
+            "PaliGemmaCleanup",
+            service_token=cleanup_provider.service_token,
+            properties=cleanup_properties,
         )
 
-        # Custom resource to delete endpoint configs
-        delete_endpoint_configs_cr = cr.AwsCustomResource(
+        cdk.CfnOutput(
             self,
-            "DeleteEndpointConfigsCustomResource",
-            on_delete=cr.AwsSdkCall(
-                service="Lambda",
-                action="invoke",
-                physical_resource_id=cr.PhysicalResourceId.of("EndpointConfigDeletion"),
-                parameters={
-                    "FunctionName": cleanup_function.function_name,
-                    "Payload": json.dumps(
-                        {
-                            "action": "DELETE_ENDPOINT_CONFIGS",
-                            "prefix": "paligemma-endpoint-config-",
-                            "region": self.region,
-                        }
-                    ),
-                },
-            ),
-            policy=cr.AwsCustomResourcePolicy.from_statements(
-                [
-                    iam.PolicyStatement(
-                        actions=["lambda:InvokeFunction"],
-                        resources=[cleanup_function.function_arn],
-                    ),
-                ]
-            ),
+            "EndpointName",
+            value=self.__endpoint_name,
+            description="SageMaker Endpoint Name for PaLiGemma Model",
         )
 
-        NagSuppressions.add_resource_suppressions_by_path(
-            cdk.Stack.of(self),
-            f"{self.node.path}/DeleteEndpointConfigsCustomResource/CustomResourcePolicy/Resource",
-            [
-                {
-                    "id": "AwsSolutions-IAM5",
-                    "reason": "Required for cleanup of all endpoint configs matching the prefix 'paligemma-endpoint-config-'. Wildcard is needed as endpoint config names are dynamically generated.",
-                    "appliesTo": [
-                        f"Resource::arn:aws:sagemaker:<AWS::Region>:<AWS::AccountId>:endpoint-config/paligemma-endpoint-config-*"
-                    ],
-                },
-            ],
+    def grant_async_inference(self, grantee: iam.IGrantable) -> None:
+        """Allow the grantee to upload async inference requests and read the responses."""
+        model_bucket = self.__model_bucket
+        grantee.grant_principal.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["s3:PutObject"],
+                resources=[model_bucket.arn_for_objects(f"{ASYNC_INPUT_PREFIX}*")],
+            )
         )
-
-        # Custom resource to delete models
-        delete_models_cr = cr.AwsCustomResource(
-            self,
-            "DeleteModelsCustomResource",
-            on_delete=cr.AwsSdkCall(
-                service="Lambda",
-                action="invoke",
-                physical_resource_id=cr.PhysicalResourceId.of("ModelDeletion"),
-                parameters={
-                    "FunctionName": cleanup_function.function_name,
-                    "Payload": json.dumps(
-                        {
-                            "action": "DELETE_MODELS",
-                            "prefix": "paligemma-model-",
-                            "region": self.region,
-                        }
-                    ),
-                },
-            ),
-            policy=cr.AwsCustomResourcePolicy.from_statements(
-                [
-                    iam.PolicyStatement(
-                        actions=["lambda:InvokeFunction"],
-                        resources=[cleanup_function.function_arn],
-                    ),
-                ]
-            ),
+        grantee.grant_principal.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["s3:GetObject"],
+                resources=[
+                    model_bucket.arn_for_objects(f"{ASYNC_OUTPUT_PREFIX}*"),
+                    model_bucket.arn_for_objects(f"{ASYNC_FAILURE_PREFIX}*"),
+                ],
+            )
+        )
+        # Missing responses return NoSuchKey instead of AccessDenied. GetObject
+        # requests carry no s3:prefix, so listing cannot be limited to a prefix
+        grantee.grant_principal.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["s3:ListBucket"],
+                resources=[model_bucket.bucket_arn],
+            )
         )
 
-        NagSuppressions.add_resource_suppressions_by_path(
-            cdk.Stack.of(self),
-            f"{self.node.path}/DeleteModelsCustomResource/CustomResourcePolicy/Resource",
+        bucket_id = cdk.Stack.of(self).get_logical_id(model_bucket.node.default_child)
+        add_nag_suppressions(
+            grantee,
             [
                 {
                     "id": "AwsSolutions-IAM5",
-                    "reason": "Required for cleanup of all SageMaker models matching the prefix 'paligemma-model-'. Wildcard is needed as model names are dynamically generated.",
+                    "reason": "Async inference requests and responses have dynamic object names",
                     "appliesTo": [
-                        "Resource::arn:aws:sagemaker:<AWS::Region>:<AWS::AccountId>:model/paligemma-model-*"
+                        f"Resource::<{bucket_id}.Arn>/{prefix}*"
+                        for prefix in (
+                            ASYNC_INPUT_PREFIX,
+                            ASYNC_OUTPUT_PREFIX,
+                            ASYNC_FAILURE_PREFIX,
+                        )
                     ],
-                }
+                },
             ],
-        )
-        # Add dependencies to ensure correct deletion order
-        delete_endpoint_configs_cr.node.add_dependency(delete_endpoint_cr)
-        delete_models_cr.node.add_dependency(delete_endpoint_configs_cr)
-
-        cdk.CfnOutput(
-            self,
-            "EndpointName",
-            value=self.__endpoint_name,
-            description="SageMaker Endpoint Name for PaLiGemma Model",
+            apply_to_children=True,
         )
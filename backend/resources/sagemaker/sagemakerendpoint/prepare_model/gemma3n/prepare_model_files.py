@@ -2,15 +2,19 @@ import os
 import pathlib
 import shutil
 
+import torch
 from dotenv import load_dotenv
 from huggingface_hub import login
+from transformers import BitsAndBytesConfig
 
 from test_utils import create_model_archive
-from code.inference import NavigationPipeline
+from src.inference import NavigationPipeline
 
 # Requirements:
-# - Make sure you've installed the dependencies in requirements.txt with 'pip install -r core/requirements.txt'
+# - Make sure you've installed the dependencies in requirements.txt with 'pip install -r src/requirements.txt'
 # - Add .env file backend/backend/sagemaker/sagemakerendpoint/prepare_model/.env with HF_TOKEN=hf_abcdefGhijKlMnoPqrs
+# - (Optional) Add QUANTIZE_4BIT=y to the .env file to save the weights in 4-bit (NF4): the archive is ~4x smaller,
+#   faster to upload and to load on the endpoint. Needs a GPU and bitsandbytes
 
 if __name__ == "__main__":
 
@@ -18,7 +22,7 @@ if __name__ == "__main__":
     login(os.getenv("HF_TOKEN"))
 
     HERE = pathlib.Path(__file__).parent.absolute()
-    code_dir = (HERE / "code").absolute()
+    code_dir = (HERE / "src").absolute()
     dst_dir = (HERE / "ARTIFACTS").absolute()
     dst_content_dir = (HERE / "ARTIFACTS" / "model").absolute()
     dst_content_code_dir = (dst_content_dir / "code").absolute()
@@ -26,11 +30,17 @@ if __name__ == "__main__":
     model_id = "google/gemma-3n-e2b-it"
 
     print("Downloading and saving model...")
-    pipeline = NavigationPipeline(model_id)
+    quantization_config = None
+    if os.getenv("QUANTIZE_4BIT") == "y":
+        print("Quantizing the weights to 4-bit...")
+        quantization_config = BitsAndBytesConfig(
+            load_in_4bit=True, bnb_4bit_quant_type="nf4", bnb_4bit_compute_dtype=torch.bfloat16
+        )
+    pipeline = NavigationPipeline(model_id, quantization_config=quantization_config)
     pipeline.processor.save_pretrained(dst_content_dir)
     pipeline.model.save_pretrained(dst_content_dir)
 
-    print(f"Creating final '{dst_content_dir}/model.tar.gz' artifact with model and inference code...")
+    print(f"Creating final '{dst_content_dir}/model.tar.gz' artifact with the model (the inference code in src/ is deployed as source_dir)...")
     create_model_archive(dst_content_dir, output_file_path = dst_dir/"package"/"model.tar.gz")
     print(f"\nArchive created successfully!")
     
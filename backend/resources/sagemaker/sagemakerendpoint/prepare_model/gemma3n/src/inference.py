@@ -1,31 +1,65 @@
 import base64
+import functools
 import json
 import logging
 import os
 import pathlib
 import time
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Union
 
-from pydantic import BaseModel
+from pydantic import BaseModel, TypeAdapter
+from PIL import Image
 from transformers import AutoProcessor, Gemma3nForConditionalGeneration
+from transformers.image_utils import load_image
 import torch
+from torchvision.io import decode_jpeg
 
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
+# Same value for every request, the compiled decoding step and its KV cache are reused
+MAX_NEW_TOKENS = 500
+# Requests generated together when an invocation sends a list (each batch size is compiled once)
+MAX_BATCH_SIZE = 4
+# Prompts are padded to this length, the KV cache (prompt and new tokens) then has the same
+# length for every navigation goal and the compiled decoding step is not invalidated
+MAX_PROMPT_TOKENS = 384
+
 
 class NavigationPipeline:
-    def __init__(self, model_dir_or_id):
+    def __init__(self, model_dir_or_id, quantization_config=None):
         
         start = time.time()
-        self.model = Gemma3nForConditionalGeneration.from_pretrained(model_dir_or_id, device_map="auto", torch_dtype=torch.bfloat16,).eval()
+        # A model saved quantized is loaded with the quantization config from its config.json
+        self.model = Gemma3nForConditionalGeneration.from_pretrained(model_dir_or_id, device_map="auto", torch_dtype=torch.bfloat16, quantization_config=quantization_config).eval()
         logger.debug(f"Loaded model in {time.time()-start: .2f}s")
         
         start = time.time()
-        self.processor = AutoProcessor.from_pretrained(model_dir_or_id)
+        # Fast (torchvision) image processor, the resize and normalization run on the model device
+        self.processor = AutoProcessor.from_pretrained(model_dir_or_id, use_fast=True)
         logger.debug(f"Loaded processor in {time.time()-start: .2f}s")
 
+        # Batched prompts are padded on the left, the generated tokens follow the prompts
+        self.processor.tokenizer.padding_side = "left"
+
+        # The chat template is rendered once per navigation goal (few distinct goals)
+        self._get_prompt_text = functools.lru_cache(maxsize=128)(self._get_prompt_text)
+
+    def warm_up(self):
+        # With a static-shaped KV cache, generate compiles the decoding step (CUDA graphs,
+        # no Python overhead per token). Gemma 3n may already set its hybrid cache, also static-shaped.
+        # Only set on the served model, the saved generation config is left unchanged
+        if self.model.generation_config.cache_implementation is None:
+            self.model.generation_config.cache_implementation = "static"
+        # Compile before the first request, it takes longer than the invocation timeout.
+        # Each batch size is compiled separately, all of them are warmed up
+        start = time.time()
+        warmup_request = {"image": Image.new("RGB", (512, 512)), "nav_goal": "door"}
+        for batch_size in range(1, MAX_BATCH_SIZE + 1):
+            self.predict_batch([warmup_request] * batch_size)
+        logger.debug(f"Compiled generation in {time.time()-start: .2f}s")
+
     def _get_prompt(self, image: str, nav_goal: str) -> List[Dict]:
         return [
             {
@@ -48,6 +82,22 @@ class NavigationPipeline:
         ]
 
     
+    def _get_prompt_text(self, nav_goal: str) -> str:
+        # Only the image placeholder is rendered, the processor adds the image tokens
+        return self.processor.apply_chat_template(
+            self._get_prompt(None, nav_goal),
+            add_generation_prompt=True,
+            tokenize=False,
+        )
+
+    def _load_image(self, image):
+        # JPEG images are decoded on the GPU (nvJPEG), the other formats with PIL on the CPU
+        if isinstance(image, str) and self.model.device.type == "cuda":
+            data = base64.b64decode(image.split("base64,")[-1])
+            if data[:3] == b"\xff\xd8\xff":
+                return decode_jpeg(torch.frombuffer(bytearray(data), dtype=torch.uint8), device=self.model.device)
+        return load_image(image)
+
     def predict(self, image: str, nav_goal: str) -> str:
         """
         image: str
@@ -55,30 +105,48 @@ class NavigationPipeline:
         nav_goal: str
             The goal of the navigation. E.g. to reach the object "chair" we put nav_goal="chair"
         """
+        return self.predict_batch([{"image": image, "nav_goal": nav_goal}])[0]
+
+    def predict_batch(self, requests: List[Dict]) -> List[str]:
+        """
+        requests: List[Dict]
+            Image and nav_goal of each request, the answers are generated in a single batch
+        """
         
-        inputs = self.processor.apply_chat_template(
-            self._get_prompt(image, nav_goal),
-            add_generation_prompt=True,
-            tokenize=True,
-            return_dict=True,
+        inputs = self.processor(
+            text=[self._get_prompt_text(request["nav_goal"]) for request in requests],
+            images=[[self._load_image(request["image"])] for request in requests],
+            device=self.model.device,
+            # The rendered template already starts with the BOS token
+            add_special_tokens=False,
+            padding="max_length",
+            max_length=MAX_PROMPT_TOKENS,
             return_tensors="pt",
         ).to(self.model.device, dtype=torch.bfloat16)
 
         input_len = inputs["input_ids"].shape[-1]
+        if input_len > MAX_PROMPT_TOKENS:
+            raise ValueError(f"The prompt is longer than {MAX_PROMPT_TOKENS} tokens, use a shorter nav_goal")
 
         with torch.inference_mode():
-            generation = self.model.generate(**inputs, max_new_tokens=500, do_sample=False)
-            generation = generation[0][input_len:]
+            generation = self.model.generate(**inputs, max_new_tokens=MAX_NEW_TOKENS, do_sample=False)
+            generation = generation[:, input_len:]
 
-        return self.processor.decode(generation, skip_special_tokens=True)
+        return self.processor.batch_decode(generation, skip_special_tokens=True)
 
 def model_fn(model_dir: str):
-    return NavigationPipeline(model_dir)
+    pipeline = NavigationPipeline(model_dir)
+    if pipeline.model.device.type == "cuda":
+        pipeline.warm_up()
+    return pipeline
 
 class InferenceInput(BaseModel):
     image: str  # Base64 encoded image
     nav_goal: str
 
+# A single request, or a list of requests generated together (e.g. the frames of a batch transform)
+InferenceRequest = TypeAdapter(Union[InferenceInput, List[InferenceInput]])
+
 def input_fn(input_data: Any, content_type: str) -> Dict:
     """
     Deserialize and validate input data for model inference
@@ -88,18 +156,26 @@ def input_fn(input_data: Any, content_type: str) -> Dict:
         content_type: Content type of the input (must be 'application/json')
     
     Returns:
-        dict: Validated input data
+        dict: Validated input data (list of dicts for a list of requests)
         
     Raises:
         ValueError: If content type is not 'application/json' or if data validation fails
     """
     if content_type == "application/json":
-        validated_input = InferenceInput.model_validate_json(input_data)
+        validated_input = InferenceRequest.validate_json(input_data)
+        if isinstance(validated_input, list):
+            if not 0 < len(validated_input) <= MAX_BATCH_SIZE:
+                raise ValueError(f"A list of requests must contain 1 to {MAX_BATCH_SIZE} requests")
+            return [request.model_dump() for request in validated_input]
         return validated_input.model_dump()
     else:
         raise ValueError("Content type must be application/json")
 
 def predict_fn(payload: Dict, pipeline: NavigationPipeline) -> str:
+    # The model server calls the handler one invocation at a time, the
+    # requests are only batched when they are sent in the same invocation
+    if isinstance(payload, list):
+        return pipeline.predict_batch(payload)
     return pipeline.predict(**payload)
 
 class InferenceResponse(BaseModel):
@@ -107,6 +183,8 @@ class InferenceResponse(BaseModel):
 
 def output_fn(prediction: str, accept: str) -> Dict:
     if accept == "application/json":
+        if isinstance(prediction, list):
+            return json.dumps([InferenceResponse(response=response).model_dump() for response in prediction])
         return InferenceResponse(response=prediction).model_dump_json()
     else:
         raise ValueError("Accept type must be application/json")
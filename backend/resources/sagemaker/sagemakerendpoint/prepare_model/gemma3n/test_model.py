@@ -1,12 +1,12 @@
 import pathlib
 from pprint import pprint
 
-from code.inference import model_fn, predict_fn
+from src.inference import NavigationPipeline, predict_fn
 from test_utils import get_base64_from_image
 
 # Requirements:
 # - You have the local artifacts for the model (have ran 'python prepare_model_files.py')
-# - Make sure you've installed the dependencies in requirements.txt with 'pip install -r core/requirements.txt'
+# - Make sure you've installed the dependencies in requirements.txt with 'pip install -r src/requirements.txt'
 
 if __name__ == "__main__":
     HERE = pathlib.Path(__file__).parent.absolute()
@@ -16,13 +16,14 @@ if __name__ == "__main__":
         raise RuntimeError("ARTIFACTS directory does not exist. Please run the prepare_model_files.py script first.")
 
     print(f"Predicting with test data...")
-    pipeline = model_fn(str(ARTIFACTS_DIR))
+    # Not model_fn, a single local prediction is faster without the compilation warm-up
+    pipeline = NavigationPipeline(str(ARTIFACTS_DIR))
     payload = {
         "image": get_base64_from_image(HERE.parent / "data" / "samples" / "sidewalk.jpg"),
         "nav_goal": "sidewalk"
     }
 
-    pprint(predict_fn(payload, pipeline))
+    pprint({"response": predict_fn(payload, pipeline)})
     # {'response': 'The image shows a street scene with a sidewalk running along the '
     #             "right side of the frame. On the left side, there's a set of "
     #             'outdoor stairs leading up to a building with a black iron '
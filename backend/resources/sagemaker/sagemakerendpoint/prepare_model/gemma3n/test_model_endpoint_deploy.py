@@ -4,14 +4,90 @@ import pathlib
 
 import boto3
 import sagemaker
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from sagemaker.async_inference import AsyncInferenceConfig
 from sagemaker.pytorch.model import PyTorchModel
 
-from test_utils import get_base64_from_image
+from test_utils import get_base64_from_image, get_directory_fingerprint, upload_model_archive
 
 # Requirements:
 # - You have the local artifacts for the model (have ran 'python prepare_model_files.py')
 # - (Optional) Have tested locally with 'python test_model.py'
 
+# Multi-GB artifact, uploaded in 64 MiB parts with more parts in flight than the boto3 defaults (8 MiB, 10 threads)
+UPLOAD_CONFIG = TransferConfig(
+    multipart_threshold=64 * 1024 * 1024,
+    multipart_chunksize=64 * 1024 * 1024,
+    max_concurrency=32,
+)
+
+
+def setup_async_autoscaling(endpoint_name: str, boto_session, max_capacity: int = 2):
+    """
+    Scale the async endpoint on its queue, down to 0 instances when no request is queued
+    (same policies as the setup_sm_endpoint_autoscaling function of the stack)
+    """
+    autoscaling_client = boto_session.client("application-autoscaling")
+    cloudwatch_client = boto_session.client("cloudwatch")
+    resource_id = f"endpoint/{endpoint_name}/variant/AllTraffic"
+
+    autoscaling_client.register_scalable_target(
+        ServiceNamespace="sagemaker",
+        ResourceId=resource_id,
+        ScalableDimension="sagemaker:variant:DesiredInstanceCount",
+        MinCapacity=0,
+        MaxCapacity=max_capacity,
+    )
+    autoscaling_client.put_scaling_policy(
+        PolicyName="SageMakerBacklogScalingPolicy",
+        ServiceNamespace="sagemaker",
+        ResourceId=resource_id,
+        ScalableDimension="sagemaker:variant:DesiredInstanceCount",
+        PolicyType="TargetTrackingScaling",
+        TargetTrackingScalingPolicyConfiguration={
+            "TargetValue": 5.0,
+            "CustomizedMetricSpecification": {
+                "MetricName": "ApproximateBacklogSizePerInstance",
+                "Namespace": "AWS/SageMaker",
+                "Dimensions": [{"Name": "EndpointName", "Value": endpoint_name}],
+                "Statistic": "Average",
+            },
+            "ScaleInCooldown": 600,
+            "ScaleOutCooldown": 300,
+        },
+    )
+
+    # The backlog per instance is not defined at zero instances, the first instance is started by an alarm
+    response = autoscaling_client.put_scaling_policy(
+        PolicyName="SageMakerHasBacklogWithoutCapacityPolicy",
+        ServiceNamespace="sagemaker",
+        ResourceId=resource_id,
+        ScalableDimension="sagemaker:variant:DesiredInstanceCount",
+        PolicyType="StepScaling",
+        StepScalingPolicyConfiguration={
+            "AdjustmentType": "ChangeInCapacity",
+            "MetricAggregationType": "Average",
+            "Cooldown": 300,
+            "StepAdjustments": [{"MetricIntervalLowerBound": 0, "ScalingAdjustment": 1}],
+        },
+    )
+    cloudwatch_client.put_metric_alarm(
+        AlarmName=f"{endpoint_name}-has-backlog-without-capacity",
+        MetricName="HasBacklogWithoutCapacity",
+        Namespace="AWS/SageMaker",
+        Dimensions=[{"Name": "EndpointName", "Value": endpoint_name}],
+        Statistic="Average",
+        Period=60,
+        EvaluationPeriods=2,
+        DatapointsToAlarm=2,
+        Threshold=1,
+        ComparisonOperator="GreaterThanOrEqualToThreshold",
+        TreatMissingData="missing",
+        AlarmActions=[response["PolicyARN"]],
+    )
+
+
 def deploy_model(
     role: str,
     artifacts_file: str,
@@ -20,7 +96,10 @@ def deploy_model(
     endpoint_name: str = "gemma3n-test-endpoint",
     pytorch_version: str ="2.6.0",
     py_version: str ="py312",
-    local: bool = True
+    local: bool = True,
+    async_inference: bool = False,
+    routing_strategy: str = "LEAST_OUTSTANDING_REQUESTS",
+    image_uri: str = None
 ):
     """
     Deploy a HuggingFace model locally using SageMaker local mode
@@ -32,10 +111,16 @@ def deploy_model(
         pytorch_version (str): PyTorch version
         py_version (str): Python version
         instance_type (str): Instance type (use 'local' for local mode)
+        async_inference (bool): Queue the requests in S3 and scale down to 0 instances when idle (cloud only)
+        routing_strategy (str): Routing of the real-time requests between instances ("LEAST_OUTSTANDING_REQUESTS" or "RANDOM")
+        image_uri (str): Inference image with the dependencies installed (see Dockerfile), the PyTorch image by default
     
     Returns:
         predictor: HuggingFace predictor object
     """
+    if local and async_inference:
+        raise ValueError("Async inference is not supported in local mode")
+
     if local:
         print("Configured local deployment...")
         model_data = f"file://{artifacts_file}"
@@ -56,7 +141,28 @@ def deploy_model(
         # Initialize SageMaker session
         sagemaker_session = sagemaker.Session()
         print("Uploading model artifact...")
-        model_data = sagemaker_session.upload_data(path=artifacts_file, bucket=sagemaker_session.default_bucket(), key_prefix=f"endpoints/{endpoint_name}")
+        bucket = sagemaker_session.default_bucket()
+        s3_client = sagemaker_session.boto_session.client("s3")
+        if pathlib.Path(artifacts_file).is_dir():
+            # Model directory, archived while it is uploaded (no local model.tar.gz). The inference
+            # code is passed as source_dir, the weights are only uploaded again when they changed
+            key = f"endpoints/{endpoint_name}/model.tar.gz"
+            fingerprint = get_directory_fingerprint(artifacts_file)
+            try:
+                uploaded_fingerprint = s3_client.head_object(Bucket=bucket, Key=key)["Metadata"].get("model-fingerprint")
+            except ClientError:
+                uploaded_fingerprint = None
+            if uploaded_fingerprint == fingerprint:
+                print("Model artifact unchanged, skipping upload")
+            else:
+                upload_model_archive(
+                    artifacts_file, bucket, key, s3_client, config=UPLOAD_CONFIG,
+                    extra_args={"Metadata": {"model-fingerprint": fingerprint}},
+                )
+        else:
+            key = f"endpoints/{endpoint_name}/{pathlib.Path(artifacts_file).name}"
+            s3_client.upload_file(artifacts_file, bucket, key, Config=UPLOAD_CONFIG)
+        model_data = f"s3://{bucket}/{key}"
         print(f"Uploaded artifact to: {model_data}")
 
     print("Preparing model...")
@@ -67,17 +173,41 @@ def deploy_model(
         role=role,
         framework_version=pytorch_version,
         py_version=py_version,
+        image_uri=image_uri,
     )
 
+    async_inference_config = None
+    if async_inference:
+        async_inference_config = AsyncInferenceConfig(
+            output_path=f"s3://{bucket}/endpoints/{endpoint_name}/async-output/",
+            failure_path=f"s3://{bucket}/endpoints/{endpoint_name}/async-failure/",
+            max_concurrent_invocations_per_instance=4,
+        )
+
+    # The generation time varies with the image and the answer, the requests go to the instance with the fewest
+    # requests in flight rather than a random one. Only for the real-time cloud endpoints
+    routing_config = None
+    if not local and not async_inference:
+        routing_config = {"RoutingStrategy": routing_strategy}
+
     try:
         print("Deploying...")
         predictor = model.deploy(
             endpoint_name=endpoint_name,
             initial_instance_count=1,
             instance_type=instance_type,
+            async_inference_config=async_inference_config,
+            routing_config=routing_config,
+            # The multi-GB model is downloaded, extracted and loaded before the container is healthy
+            model_data_download_timeout=None if local else 1200,
+            container_startup_health_check_timeout=None if local else 900,
             wait=True
         )
         print(f"Model deployed successfully in endpoint {endpoint_name}!")
+
+        if async_inference:
+            setup_async_autoscaling(endpoint_name, sagemaker_session.boto_session)
+            print("Configured autoscaling on the queued requests (0 to 2 instances)")
     
         return predictor
     
@@ -92,7 +222,8 @@ if __name__ == "__main__":
 
     # Get IAM role
     role = sagemaker.get_execution_role() if sagemaker.get_execution_role() else "arn:aws:iam::111111111111:role/service-role/AmazonSageMaker-ExecutionRole-20200101T000001"
-    artifacts_file = (pathlib.Path(__file__).parent / "ARTIFACTS" / "package" / "model.tar.gz").absolute()
+    # The cloud deployment archives the model directory while uploading it, the local one needs the model.tar.gz file
+    artifacts_file = (pathlib.Path(__file__).parent / "ARTIFACTS" / "model").absolute()
     code_dir = (HERE / "src").absolute()
 
     try:
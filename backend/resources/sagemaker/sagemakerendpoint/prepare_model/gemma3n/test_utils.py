@@ -1,8 +1,20 @@
 import base64
+import gzip
+import hashlib
+import io
 import os
+import shutil
+import subprocess
 import tarfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+# Files read ahead in threads while the previous ones are archived (tokenizer, configs, code...).
+# The larger ones (weight shards) are streamed from disk, the memory used is bounded
+PREFETCH_WORKERS = 16
+PREFETCH_MAX_FILE_SIZE = 16 * 1024 * 1024
+
 
 def get_base64_from_image(image_path: str) -> str:
     with open(image_path, 'rb') as img_file:
@@ -12,13 +24,85 @@ def get_base64_from_image(image_path: str) -> str:
     return data_uri
 
 
-def create_model_archive(source_dir: str | Path, output_file_path: str | Path):
+def iter_files(directory: str, base_len: int):
+    """
+    Yield the files of the directory tree with their path relative to the base directory,
+    os.scandir gives the entry types without a stat per file
+    """
+    for entry in os.scandir(directory):
+        if entry.is_dir(follow_symlinks=False):
+            yield from iter_files(entry.path, base_len)
+        elif entry.is_file():
+            yield entry.path, entry.path[base_len:]
+
+
+def read_small_file(file_path: str) -> bytes | None:
+    if os.path.getsize(file_path) > PREFETCH_MAX_FILE_SIZE:
+        return None
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def write_model_archive(source_dir: Path, output_file, compresslevel: int = 1):
+    """
+    Write a tar.gz archive of the source directory to a binary file object (file or pipe).
+    
+    Args:
+        source_dir (Path): Absolute path to the source directory
+        output_file: Binary file object with a file descriptor
+        compresslevel (int): gzip compression level, 1 by default as the model weights barely compress
+    """
+    # Compress with pigz when available (gzip on all the cores), the tar stream is piped to it
+    pigz = shutil.which("pigz")
+    if pigz:
+        compressor = subprocess.Popen(
+            [pigz, f"-{compresslevel}", "-n", "-p", str(os.cpu_count())], stdin=subprocess.PIPE, stdout=output_file
+        )
+        compressed_stream = compressor.stdin
+    else:
+        compressor = gzip.GzipFile(fileobj=output_file, mode="wb", compresslevel=compresslevel, mtime=0)
+        compressed_stream = compressor
+    tar = tarfile.open(fileobj=compressed_stream, mode="w|")
+
+    def add_file(file_path, arc_name, prefetched_data):
+        # Add the file to the archive, with its path relative to the source directory
+        data = prefetched_data.result()
+        if data is None:
+            tar.add(file_path, arcname=arc_name)
+        else:
+            tar.addfile(tar.gettarinfo(file_path, arcname=arc_name), io.BytesIO(data))
+
+    # Walk through all files and directories
+    file_paths = list(iter_files(str(source_dir), len(str(source_dir)) + 1))
+
+    # The files are added in the walk order by this thread only, at most PREFETCH_WORKERS are read ahead
+    read_ahead = deque()
+    with tar, ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+        for file_path, arc_name in file_paths:
+            read_ahead.append((file_path, arc_name, executor.submit(read_small_file, file_path)))
+            if len(read_ahead) > PREFETCH_WORKERS:
+                add_file(*read_ahead.popleft())
+        while read_ahead:
+            add_file(*read_ahead.popleft())
+
+    if pigz:
+        compressor.stdin.close()
+        if compressor.wait() != 0:
+            raise RuntimeError(f"pigz failed with exit code {compressor.returncode}")
+    else:
+        compressor.close()
+
+    print(f"Added {len(file_paths)} files to archive")
+
+
+def create_model_archive(source_dir: str | Path, output_file_path: str | Path, compresslevel: int = 1):
     """
     Create a tar.gz archive from the source directory.
     
     Args:
         source_dir (str): Path to the source directory (ARTIFACTS)
         output_file_path (str): Path to the final tar.gz file (e.g. output_file_path="ARTIFACTS/model.tar.gz")
+        compresslevel (int): gzip compression level, 1 by default as the model weights barely compress
     """
     # Convert to absolute paths
     source_dir = Path(source_dir).absolute()
@@ -28,15 +112,57 @@ def create_model_archive(source_dir: str | Path, output_file_path: str | Path):
     if not source_dir.is_dir():
         raise ValueError(f"Source directory {source_dir} does not exist or is not a directory")
     
-    # Create the tar.gz file
-    with tarfile.open(output_file_path, "w:gz") as tar:
-        # Walk through all files and directories
-        for root, dirs, files in os.walk(source_dir):
-            for file in files:
-                # Get the full path of the file
-                file_path = Path(root) / file
-                # Get the relative path for the archive
-                arc_name = file_path.relative_to(source_dir)
-                # Add the file to the archive
-                tar.add(file_path, arcname=arc_name)
-                print(f"Added {arc_name} to archive")
+    with open(output_file_path, "wb") as output_file:
+        write_model_archive(source_dir, output_file, compresslevel)
+
+
+def get_directory_fingerprint(source_dir: str | Path) -> str:
+    """
+    Hash of the paths, sizes and modification times of the files in the directory.
+    Changes when a file is added, removed or rewritten, without reading the files.
+    """
+    source_dir = Path(source_dir).absolute()
+    digest = hashlib.md5(usedforsecurity=False)
+    for root, dirs, files in sorted(os.walk(source_dir)):
+        for file in sorted(files):
+            file_stat = (Path(root) / file).stat()
+            digest.update(f"{(Path(root) / file).relative_to(source_dir)}:{file_stat.st_size}:{file_stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def upload_model_archive(source_dir: str | Path, bucket: str, key: str, s3_client, config=None, compresslevel: int = 1, extra_args=None):
+    """
+    Upload a tar.gz archive of the source directory to S3, without writing it to disk.
+    The archive is written to a pipe in a thread while its parts are uploaded.
+    
+    Args:
+        source_dir (str): Path to the source directory (ARTIFACTS/model)
+        bucket (str): Destination bucket
+        key (str): Destination key (e.g. key="endpoints/gemma3n-test-endpoint/model.tar.gz")
+        s3_client: boto3 S3 client
+        config (TransferConfig): Multipart upload configuration
+        compresslevel (int): gzip compression level
+        extra_args (dict): Extra arguments of the upload (e.g. object metadata)
+    """
+    source_dir = Path(source_dir).absolute()
+    if not source_dir.is_dir():
+        raise ValueError(f"Source directory {source_dir} does not exist or is not a directory")
+
+    read_fd, write_fd = os.pipe()
+
+    def write_to_pipe():
+        with os.fdopen(write_fd, "wb") as pipe_writer:
+            write_model_archive(source_dir, pipe_writer, compresslevel)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        writer = executor.submit(write_to_pipe)
+        # Closing the read end on failure stops the writer (broken pipe)
+        with os.fdopen(read_fd, "rb") as pipe_reader:
+            s3_client.upload_fileobj(pipe_reader, bucket, key, ExtraArgs=extra_args, Config=config)
+        try:
+            writer.result()
+        except Exception:
+            # The upload ends at the broken archive, the truncated object (and its
+            # metadata, e.g. the model fingerprint) must not be taken for the model
+            s3_client.delete_object(Bucket=bucket, Key=key)
+            raise
@@ -0,0 +1,96 @@
+# Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
+# SPDX-License-Identifier: MIT-0
+
+# Shared by the download scripts of the pipelines, mounted in the processing
+# container next to the script (see GenericDownloadAndPackPipeline)
+
+import subprocess
+import sys
+
+# Install the Hugging Face Hub library
+subprocess.check_call([sys.executable, "-m", "pip", "install", "huggingface_hub"])
+
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import boto3
+from huggingface_hub import HfApi, hf_hub_download
+
+output_dir = "/opt/ml/processing/output"
+cache_dir = "/opt/ml/processing/hfcache"  # Hugging Face cache directory
+# S3 prefix persisting the downloaded files across the pipeline executions
+cache_s3_uri = os.environ.get("HF_CACHE_S3_URI")
+
+s3_client = boto3.client("s3")
+
+
+def split_s3_uri(uri):
+    bucket, key = uri[len("s3://") :].split("/", 1)
+    return bucket, key
+
+
+def download_and_zip(repo_id, onnx_files):
+    """Download the model files of the repository and zip them to model.zip.
+
+    Only the onnx_files are kept from the /onnx directory, the other variants
+    are not downloaded.
+    """
+    cached_files = set()
+    if cache_s3_uri:
+        cache_bucket, cache_prefix = split_s3_uri(cache_s3_uri)
+
+    def restore_cached_file(key):
+        relative_path = key[len(cache_prefix) :]
+        local_path = os.path.join(cache_dir, relative_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        s3_client.download_file(cache_bucket, key, local_path)
+        cached_files.add(relative_path)
+
+    def download_file(file):
+        # Returns the snapshot file without downloading it when it is in the cache
+        file_path = hf_hub_download(repo_id, file, cache_dir=cache_dir)
+        relative_path = os.path.relpath(file_path, cache_dir)
+        if cache_s3_uri and relative_path not in cached_files:
+            s3_client.upload_file(
+                file_path, cache_bucket, f"{cache_prefix}{relative_path}"
+            )
+        return file_path
+
+    # Step 1: List the model files, without the unwanted files from the /onnx directory
+    repo_files = [
+        file
+        for file in HfApi().list_repo_files(repo_id)
+        if os.path.dirname(file) != "onnx" or os.path.basename(file) in onnx_files
+    ]
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        # Step 2: Restore the files downloaded by the previous executions. Only the
+        # snapshot files are persisted, hf_hub_download only checks they exist
+        if cache_s3_uri:
+            paginator = s3_client.get_paginator("list_objects_v2")
+            cache_keys = [
+                cache_object["Key"]
+                for page in paginator.paginate(Bucket=cache_bucket, Prefix=cache_prefix)
+                for cache_object in page.get("Contents", [])
+            ]
+            list(executor.map(restore_cached_file, cache_keys))
+            print(f"Restored {len(cached_files)} files from {cache_s3_uri}")
+
+        print(f"Downloading {len(repo_files)} files from {repo_id}")
+
+        # Step 3: Download the files in parallel and zip each file once downloaded
+        zip_file_path = os.path.join(output_dir, "model.zip")
+        os.makedirs(output_dir, exist_ok=True)
+
+        # The quantized ONNX models barely compress, the files are stored without deflate
+        with zipfile.ZipFile(
+            zip_file_path, "w", zipfile.ZIP_STORED, allowZip64=True
+        ) as zipf:
+            futures = {
+                executor.submit(download_file, file): file for file in repo_files
+            }
+            for future in as_completed(futures):
+                zipf.write(future.result(), futures[future])
+
+    print(f"Model zipped to {zip_file_path}")
@@ -1,17 +1,24 @@
 # Copyright Amazon.com, Inc. or its affiliates. All Rights Reserved.
 # SPDX-License-Identifier: MIT-0
 
+import os
+
 import shared_variables as shared_variables
 from sagemaker import image_uris
-from sagemaker.processing import ProcessingJob, ProcessingOutput
+from sagemaker.lambda_helper import Lambda
+from sagemaker.processing import ProcessingInput, ProcessingOutput
 from sagemaker.sklearn.estimator import SKLearn
 from sagemaker.sklearn.processing import SKLearnProcessor
 from sagemaker.workflow.execution_variables import ExecutionVariables
 from sagemaker.workflow.functions import Join
+from sagemaker.workflow.lambda_step import LambdaStep
 from sagemaker.workflow.parameters import ParameterString
 from sagemaker.workflow.pipeline import Pipeline
 from sagemaker.workflow.step_collections import RegisterModel
-from sagemaker.workflow.steps import ProcessingStep
+from sagemaker.workflow.steps import CacheConfig, ProcessingStep
+
+# Download code shared by the pipeline scripts, each script only sets its model
+COMMON_CODE_DIR = os.path.join(os.path.dirname(__file__), "common")
 
 
 class GenericDownloadAndPackPipeline:
@@ -29,6 +36,7 @@ class GenericDownloadAndPackPipeline:
         script_path,
         script_name,
         sagemaker_session,
+        publish_function_arn,
         default_approval_status="PendingManualApproval",
     ):
 
@@ -55,15 +63,10 @@ class GenericDownloadAndPackPipeline:
             instance_count=1,
             base_job_name="download-and-zip",
             sagemaker_session=pipeline_session,
-        )
-
-        final_model_output_s3_uri = Join(
-            on="/",
-            values=[
-                export_model_output_s3_uri,
-                ExecutionVariables.PIPELINE_EXECUTION_ID,
-                ExecutionVariables.START_DATETIME,
-            ],
+            # The downloaded files are kept in the input bucket, the next executions only download the new files
+            env={
+                "HF_CACHE_S3_URI": f"s3://{input_bucket_name}/{prefix_bucket_path}/hfcache/"
+            },
         )
 
         # Processing/training Step
@@ -72,13 +75,32 @@ class GenericDownloadAndPackPipeline:
             display_name="Download and pack the model",
             description="This is a sample step. If you want to use or create your own model, you can change this step into a real ML pipeline with data processing, training, etc.",
             processor=script_processor,
+            inputs=[
+                ProcessingInput(
+                    source=COMMON_CODE_DIR,
+                    destination="/opt/ml/processing/input/common",
+                )
+            ],
             outputs=[
                 ProcessingOutput(
                     source="/opt/ml/processing/output",
-                    destination=final_model_output_s3_uri,
+                    # No execution variable in the destination, it would change the cache key on every execution.
+                    # The next executions overwrite this model.zip, PublishModel copies it to the execution prefix
+                    destination=export_model_output_s3_uri,
                 )
             ],
             code=script_path,
+            # The executions with the same script and parameters reuse the model packed by the previous one
+            cache_config=CacheConfig(enable_caching=True, expire_after="P30D"),
+        )
+
+        final_model_output_s3_uri = Join(
+            on="/",
+            values=[
+                export_model_output_s3_uri,
+                ExecutionVariables.PIPELINE_EXECUTION_ID,
+                ExecutionVariables.START_DATETIME,
+            ],
         )
 
         # Model Artifacts S3 URI
@@ -86,6 +108,29 @@ class GenericDownloadAndPackPipeline:
             on="/", values=[final_model_output_s3_uri, "model.zip"]
         )
 
+        # Not cached, each registered model version points to its own immutable copy.
+        # Only the model.zip object is copied, not the other executions' copies
+        publish_step = LambdaStep(
+            name="PublishModel",
+            display_name="Copy the packed model to the execution output",
+            lambda_func=Lambda(
+                function_arn=publish_function_arn, session=pipeline_session
+            ),
+            inputs={
+                # From the execution which ran the step when it is cached
+                "SourceUri": Join(
+                    on="/",
+                    values=[
+                        processing_step.properties.ProcessingOutputConfig.Outputs[
+                            0
+                        ].S3Output.S3Uri,
+                        "model.zip",
+                    ],
+                ),
+                "DestinationUri": model_artifact_s3_uri,
+            },
+        )
+
         ##### Dummy estimator ######
         # An estimator is needed to register the model. We did not use one as we did not train the model ourselves.
         # We use a dummy one for the registration.
@@ -117,7 +162,7 @@ class GenericDownloadAndPackPipeline:
             transform_instances=[instance_type],
             model_package_group_name=package_group_name,
             approval_status=approval_status,
-            depends_on=[processing_step],
+            depends_on=[publish_step],
         )
 
         # Define the pipeline
@@ -129,7 +174,7 @@ class GenericDownloadAndPackPipeline:
                 package_group_name,
                 approval_status,
             ],
-            steps=[processing_step, register_model_step],
+            steps=[processing_step, publish_step, register_model_step],
             sagemaker_session=sagemaker_session,
         )
 
@@ -3,13 +3,13 @@
 import os
 
 import boto3
+import shared_variables as shared_variables
+from pipelines.generic_download_pack_pipeline_definition import (
+    GenericDownloadAndPackPipeline,
+)
 from sagemaker import Session
 from sagemaker.workflow.pipeline_context import PipelineSession
 
-import shared_variables as shared_variables
-from pipelines.generic_download_pack_pipeline_definition import \
-    GenericDownloadAndPackPipeline
-
 # ANSI escape code for green text
 GREEN = "\033[92m"
 # ANSI escape code to reset color
@@ -74,6 +74,9 @@ SAGEMAKER_DOMAIN_ARN = get_output_value(
 EXECUTION_ROLE = get_output_value(
     outputs, shared_variables.CDK_OUT_EXPORT_SAGEMAKER_EXECUTION_ROLE_ARN
 )
+PUBLISH_MODEL_FUNCTION_ARN = get_output_value(
+    outputs, shared_variables.CDK_OUT_EXPORT_SAGEMAKER_PUBLISH_MODEL_FUNCTION_ARN
+)
 
 print("\n\n")
 print("#########################")
@@ -88,6 +91,7 @@ print(SAGEMAKER_TTS_MODEL_PACKAGE_GROUP_NAME)
 print(SAGEMAKER_IMAGE_CAPTIONING_MODEL_PACKAGE_GROUP_NAME)
 print(SAGEMAKER_OBJECT_DETECTION_MODEL_PACKAGE_GROUP_NAME)
 print(EXECUTION_ROLE)
+print(PUBLISH_MODEL_FUNCTION_ARN)
 print("********\n\n")
 
 
@@ -121,6 +125,7 @@ depth_pipeline = GenericDownloadAndPackPipeline(
     script_path="./resources/sagemaker/sagemakerpipeline/pipelines/depth/script/depth_script.py",
     script_name="depth_script.py",
     sagemaker_session=sagemaker_session,
+    publish_function_arn=PUBLISH_MODEL_FUNCTION_ARN,
 ).get_pipeline()
 
 pipeline_response = depth_pipeline.upsert(role_arn=EXECUTION_ROLE, tags=[domain_tag])
@@ -153,6 +158,7 @@ image_captioning_pipeline = GenericDownloadAndPackPipeline(
     script_path="./resources/sagemaker/sagemakerpipeline/pipelines/image_captioning/script/ic_script.py",
     script_name="ic_script.py",
     sagemaker_session=sagemaker_session,
+    publish_function_arn=PUBLISH_MODEL_FUNCTION_ARN,
 ).get_pipeline()
 
 pipeline_response = image_captioning_pipeline.upsert(
@@ -187,6 +193,7 @@ object_detection_pipeline = GenericDownloadAndPackPipeline(
     script_path="./resources/sagemaker/sagemakerpipeline/pipelines/object_detection/script/od_script.py",
     script_name="od_script.py",
     sagemaker_session=sagemaker_session,
+    publish_function_arn=PUBLISH_MODEL_FUNCTION_ARN,
 ).get_pipeline()
 
 pipeline_response = object_detection_pipeline.upsert(
@@ -222,6 +229,7 @@ tts_pipeline = GenericDownloadAndPackPipeline(
     script_path="./resources/sagemaker/sagemakerpipeline/pipelines/tts/script/tts_script.py",
     script_name="tts_script.py",
     sagemaker_session=sagemaker_session,
+    publish_function_arn=PUBLISH_MODEL_FUNCTION_ARN,
 ).get_pipeline()
 
 pipeline_response = tts_pipeline.upsert(role_arn=EXECUTION_ROLE, tags=[domain_tag])
@@ -253,6 +261,7 @@ vocoder_pipeline = GenericDownloadAndPackPipeline(
     script_path="./resources/sagemaker/sagemakerpipeline/pipelines/vocoder/script/vocoder_script.py",
     script_name="vocoder_script.py",
     sagemaker_session=sagemaker_session,
+    publish_function_arn=PUBLISH_MODEL_FUNCTION_ARN,
 ).get_pipeline()
 
 pipeline_response = vocoder_pipeline.upsert(role_arn=EXECUTION_ROLE, tags=[domain_tag])
@@ -5,6 +5,9 @@ STACK_NAME_PROD = "vis-assis-backend-prod"
 
 STACK_NAME = STACK_NAME_DEV
 
+# cdk-nag AwsSolutions checks, enable with ENABLE_CDK_NAG=true (e.g. in CI)
+ENABLE_CDK_NAG = os.getenv("ENABLE_CDK_NAG", "false").lower() == "true"
+
 # CDK outputs export names
 CDK_OUT_KEY_S3_BUCKET_SAGEMAKER_INPUT_NAME = "SagemakerInputS3BucketName"
 CDK_OUT_EXPORT_S3_BUCKET_SAGEMAKER_INPUT_NAME = (
@@ -36,20 +39,10 @@ CDK_OUT_KEY_SAGEMAKER_DOMAIN_ARN = "SagemakerDomainARN"
 CDK_OUT_EXPORT_SAGEMAKER_DOMAIN_ARN = f"{STACK_NAME}-{CDK_OUT_KEY_SAGEMAKER_DOMAIN_ARN}"
 
 CDK_OUT_KEY_COGNITO_USER_POOL_ID = "CognitoUserPoolId"
-CDK_OUT_EXPORT_COGNITO_USER_POOL_ID = f"{STACK_NAME}-{CDK_OUT_KEY_COGNITO_USER_POOL_ID}"
 
 CDK_OUT_KEY_COGNITO_USER_POOL_CLIENT_ID = "CognitoUserPoolClientId"
-CDK_OUT_EXPORT_COGNITO_USER_POOL_CLIENT_ID = (
-    f"{STACK_NAME}-{CDK_OUT_KEY_COGNITO_USER_POOL_CLIENT_ID}"
-)
-
-CDK_OUT_KEY_COGNITO_IDENTITY_POOL_ID = "CognitoIdentityPoolId"
-CDK_OUT_EXPORT_COGNITO_IDENTITY_POOL_ID = (
-    f"{STACK_NAME}-{CDK_OUT_KEY_COGNITO_IDENTITY_POOL_ID}"
-)
 
 CDK_OUT_KEY_API_GATEWAY_ENDPOINT = "ApiGatewayEndpoint"
-CDK_OUT_EXPORT_API_GATEWAY_ENDPOINT = f"{STACK_NAME}-{CDK_OUT_KEY_API_GATEWAY_ENDPOINT}"
 
 CDK_OUT_KEY_SAGEMAKER_DEPTH_MODEL_PACKAGE_GROUP_NAME = (
     "vis-assis-depth-model-package-group"
@@ -89,6 +82,11 @@ CDK_OUT_EXPORT_SAGEMAKER_EXECUTION_ROLE_ARN = (
     f"{STACK_NAME}-{CDK_OUT_KEY_SAGEMAKER_EXECUTION_ROLE_ARN}"
 )
 
+CDK_OUT_KEY_SAGEMAKER_PUBLISH_MODEL_FUNCTION_ARN = "SagemakerPublishModelFunctionARN"
+CDK_OUT_EXPORT_SAGEMAKER_PUBLISH_MODEL_FUNCTION_ARN = (
+    f"{STACK_NAME}-{CDK_OUT_KEY_SAGEMAKER_PUBLISH_MODEL_FUNCTION_ARN}"
+)
+
 CDK_OUT_KEY_EVENTBRIDGE_PIPELINE_EXECUTION_ROLE_ARN = (
     "EventBridgeSagemakerPipelineExecutionRoleARN"
 )